@@ -5,7 +5,8 @@ from PyInstaller.__main__ import run
 
 # Configuration
 APP_NAME = 'yt-dlp_gui'
-SCRIPT_FILE = 'youtube_downloader.py'
+SOURCE_DIR = 'yt-dlp'
+SCRIPT_FILE = os.path.join(SOURCE_DIR, 'regui.py')
 ICON_FILE = 'app_icon.ico'  # Create or download an icon file
 FFMPEG_DIR = 'ffmpeg'  # Place FFmpeg binaries here
 
@@ -24,6 +25,10 @@ opts = [
     f'--icon={ICON_FILE}',
     f'--add-data={FFMPEG_DIR};{FFMPEG_DIR}',
     '--add-data=app_icon.ico;.',
+    f'--paths={SOURCE_DIR}',
+    '--hidden-import=downloader_core',
+    '--hidden-import=job_api',
+    '--hidden-import=headless',
     '--hidden-import=mutagen.id3',
     '--hidden-import=mutagen.oggvorbis',
     '--hidden-import=mutagen.mp3',
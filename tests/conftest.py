@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The application modules live in yt-dlp/, which is not an importable package name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "yt-dlp"))
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: timing measurements, deselect with -m 'not benchmark'")
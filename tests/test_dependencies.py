@@ -0,0 +1,34 @@
+import os
+import stat
+import sys
+
+import pytest
+
+from downloader_core import DependencyCheck
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="stub scripts are POSIX shell scripts")
+
+def install(directory, name, script):
+    binary = directory / name
+    binary.write_text(f"#!/bin/sh\n{script}\n")
+    binary.chmod(binary.stat().st_mode | stat.S_IEXEC)
+    # Make sure the directory's mtime moves even on coarse timestamp filesystems
+    later = directory.stat().st_mtime + 10
+    os.utime(directory, (later, later))
+
+def test_ytdlp_installed_after_caching_is_found(tmp_path, monkeypatch):
+    tools = tmp_path / "tools"
+    bin_dir = tmp_path / "bin"
+    tools.mkdir()
+    bin_dir.mkdir()
+    for name in ("aria2c", "ffmpeg", "ffprobe"):
+        install(tools, name, "exit 0")
+    monkeypatch.setenv("PATH", f"{tools}{os.pathsep}{bin_dir}")
+    check = DependencyCheck(cache_path=str(tmp_path / "dependencies.json"))
+    
+    # aria2c and FFmpeg are found, yt-dlp is not; the cached result must not outlive a later install
+    result = check.run()
+    assert result["ffmpeg_path"] == str(tools)
+    assert result["ytdlp_version"] == ""
+    install(bin_dir, "yt-dlp", "echo 2024.08.06")
+    assert check.run()["ytdlp_version"] == "2024.08.06"
@@ -0,0 +1,61 @@
+import functools
+import http.server
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+import downloader_core as core
+
+ITEMS = 5
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def clip_server(tmp_path):
+    """Serves a small clip.mp4 from a local thread, yields its base URL"""
+    root = tmp_path / "www"
+    root.mkdir()
+    (root / "clip.mp4").write_bytes(os.urandom(64 * 1024))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def per_item_seconds(engine, base_url, output_path):
+    """Seconds per item for one engine, after a warm-up item that pays the one-time setup"""
+    settings = {
+        "download_engine": engine, "max_concurrent_downloads": 1,
+        "enable_workarounds": False, "use_download_archive": False,
+    }
+    runner = core.DownloadRunner(settings)
+    options = {"format": "Best Quality", "container": "Original", "output_path": str(output_path)}
+    try:
+        runner.add_job(f"{base_url}/clip.mp4?warmup", options)
+        assert runner.wait_idle(120)
+        started = time.perf_counter()
+        for i in range(ITEMS):
+            runner.add_job(f"{base_url}/clip.mp4?item={i}", options)
+        assert runner.wait_idle(300)
+        elapsed = time.perf_counter() - started
+        assert [job.status for job in runner.jobs] == ["Completed"] * (ITEMS + 1)
+    finally:
+        runner.close()
+    return elapsed / ITEMS
+
+@pytest.mark.benchmark
+def test_per_item_overhead(clip_server, tmp_path):
+    pytest.importorskip("yt_dlp")
+    if not shutil.which("yt-dlp"):
+        pytest.skip("yt-dlp executable not on PATH")
+    
+    in_process = per_item_seconds("In-process", clip_server, tmp_path / "in-process")
+    subprocess_ = per_item_seconds("Subprocess", clip_server, tmp_path / "subprocess")
+    print(f"\nper item: in-process {in_process * 1000:.0f} ms, subprocess {subprocess_ * 1000:.0f} ms")
+    assert in_process < subprocess_
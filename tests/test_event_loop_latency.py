@@ -0,0 +1,87 @@
+import os
+import time
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+pytest.importorskip("PyQt6")
+from PyQt6.QtCore import QThread, QTimer, pyqtSignal
+from PyQt6.QtWidgets import QApplication
+
+import regui
+from downloader_core import JobJournal
+
+JOBS = 500
+HEARTBEAT_MS = 10
+
+class FakeTask:
+    is_running = True
+    
+    def stop(self):
+        self.is_running = False
+    
+    def fragment_speed(self):
+        return 0.0
+
+class FakeDownloadThread(QThread):
+    """Stands in for DownloadThread, emitting a short download's worth of signals from its own thread"""
+    progress_signal = pyqtSignal(int, str, float)
+    stage_signal = pyqtSignal(str)
+    entries_signal = pyqtSignal(list)
+    error_signal = pyqtSignal(str)
+    log_signal = pyqtSignal(list)
+    finished_signal = pyqtSignal(bool, str)
+    
+    def __init__(self, url, options, ffmpeg_dir=None, settings=None, journal=None, key=None):
+        super().__init__()
+        self.task = FakeTask()
+    
+    def run(self):
+        self.stage_signal.emit("Downloading")
+        for percent in (25, 50, 75, 100):
+            self.progress_signal.emit(percent, f"{percent}%", 1024.0)
+        self.log_signal.emit(["[download] 100% of 1.00MiB"])
+        self.finished_signal.emit(True, "Download completed successfully!")
+
+@pytest.fixture
+def app():
+    return QApplication.instance() or QApplication([])
+
+def test_queue_keeps_event_loop_responsive(app, monkeypatch, tmp_path):
+    monkeypatch.setattr(regui, "DownloadThread", FakeDownloadThread)
+    settings = {"enable_workarounds": False, "host_max_in_flight": JOBS}
+    journal_path = str(tmp_path / "download_journal.json")
+    scheduler = regui.DownloadScheduler(4)
+    # Journaled like the application's scheduler, every queued, started and finished job is recorded
+    scheduler.journal = JobJournal(journal_path)
+    scheduler.budget.configure(settings)
+    
+    def submit():
+        for i in range(JOBS):
+            scheduler.add_job(f"https://host{i % 50}.example/{i}", {}, None, settings)
+        scheduler.start()
+    
+    gaps = []
+    last = [time.monotonic()]
+    def beat():
+        now = time.monotonic()
+        gaps.append(now - last[0])
+        last[0] = now
+    heartbeat = QTimer()
+    heartbeat.timeout.connect(beat)
+    heartbeat.start(HEARTBEAT_MS)
+    
+    results = []
+    scheduler.batch_finished.connect(lambda succeeded, failed: (results.append((succeeded, failed)), app.quit()))
+    # Fail rather than hang if the batch never completes
+    QTimer.singleShot(60000, app.quit)
+    # Queued from the event loop, so the time spent queueing shows up as a gap
+    QTimer.singleShot(0, submit)
+    app.exec()
+    heartbeat.stop()
+    scheduler.journal.flush()
+    
+    assert results == [(JOBS, 0)]
+    assert JobJournal(journal_path).jobs == {}
+    print(f"\nmax event loop gap {max(gaps) * 1000:.1f} ms over {len(gaps)} beats")
+    assert max(gaps) < 0.1
@@ -0,0 +1,35 @@
+from downloader_core import HostBudget, host_key
+
+def test_host_key_groups_subdomains():
+    assert host_key("https://artist.bandcamp.com/album/x") == "bandcamp.com"
+    assert host_key("https://www.bbc.co.uk/iplayer") == "bbc.co.uk"
+    assert host_key("https://youtu.be/abc") == "youtube.com"
+
+def test_host_key_keeps_ip_addresses():
+    assert host_key("http://127.0.0.1:8765/clip.mp4") == "127.0.0.1"
+    assert host_key("http://10.0.0.1/clip.mp4") == "10.0.0.1"
+    assert host_key("http://[::1]:8080/clip.mp4") == "::1"
+
+def test_in_flight_cap():
+    budget = HostBudget()
+    budget.configure({"host_max_in_flight": 2, "enable_workarounds": False})
+    budget.acquire("example.com", 0.0)
+    assert budget.wait_time("example.com", 0.0) == 0.0
+    budget.acquire("example.com", 0.0)
+    assert budget.wait_time("example.com", 0.0) is None
+    budget.release("example.com")
+    assert budget.wait_time("example.com", 0.0) == 0.0
+
+def test_start_interval():
+    budget = HostBudget()
+    budget.configure({"host_max_in_flight": 4, "host_min_interval": 5})
+    budget.acquire("example.com", 100.0)
+    assert budget.wait_time("example.com", 102.0) == 3.0
+    assert budget.wait_time("example.com", 106.0) == 0.0
+    assert budget.wait_time("other.com", 102.0) == 0.0
+
+def test_host_overrides():
+    budget = HostBudget()
+    budget.configure({"host_max_in_flight": 1, "host_limits": {"example.com": {"max_in_flight": 3}}})
+    assert budget.limits("example.com")["max_in_flight"] == 3
+    assert budget.limits("other.com")["max_in_flight"] == 1
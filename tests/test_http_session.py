@@ -0,0 +1,62 @@
+import http.server
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import downloader_core as core
+
+pytest.importorskip("requests")
+Image = pytest.importorskip("PIL.Image")
+
+FETCHES = 200
+POOL_SIZE = 4
+
+class CountingServer(http.server.ThreadingHTTPServer):
+    """Counts accepted connections, keep-alive clients should reuse a handful"""
+    daemon_threads = True
+    connections = 0
+    
+    def get_request(self):
+        request = super().get_request()
+        self.connections += 1
+        return request
+
+class ThumbnailHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    body = b""
+    
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+    
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def thumbnail_server():
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 36), "red").save(buffer, "PNG")
+    ThumbnailHandler.body = buffer.getvalue()
+    server = CountingServer(("127.0.0.1", 0), ThumbnailHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    core.reset_http_session()
+    yield server
+    core.reset_http_session()
+    server.shutdown()
+    server.server_close()
+
+def test_thumbnail_fetches_reuse_connections(thumbnail_server):
+    settings = {"http_pool_size": POOL_SIZE}
+    task = core.DownloadTask("https://example.com/v", {}, settings=settings, events=core.TaskEvents())
+    url = f"http://127.0.0.1:{thumbnail_server.server_address[1]}/thumb.png"
+    # No id, so every call goes to the network instead of the thumbnail cache
+    with ThreadPoolExecutor(POOL_SIZE) as executor:
+        results = list(executor.map(lambda i: task.fetch_thumbnail({"thumbnail": f"{url}?{i}"}), range(FETCHES)))
+    assert all(results)
+    assert thumbnail_server.connections <= POOL_SIZE
@@ -0,0 +1,108 @@
+import http.client
+import json
+
+import pytest
+
+from job_api import JobApiServer
+
+class FakeJob:
+    def __init__(self, job_id, url, options):
+        self.job_id = job_id
+        self.url = url
+        self.options = options
+        self.status = "Queued"
+        self.stage = ""
+        self.progress = 0
+        self.speed = 0.0
+        self.message = ""
+        self.error = ""
+        self.parent = None
+        self.children = []
+
+class FakeBackend:
+    def __init__(self):
+        self.submitted = []
+    
+    def queued_count(self):
+        return len(self.submitted)
+    
+    def submit(self, urls, options):
+        jobs = [FakeJob(len(self.submitted) + i + 1, url, options) for i, url in enumerate(urls)]
+        self.submitted += jobs
+        return jobs
+    
+    def jobs(self):
+        return list(self.submitted)
+    
+    def cancel(self, job):
+        job.status = "Stopped"
+        return True
+
+@pytest.fixture
+def api():
+    backend = FakeBackend()
+    server = JobApiServer(backend, port=0).start()
+    yield server, backend
+    server.stop()
+
+def request(server, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+    data = body if isinstance(body, (bytes, type(None))) else json.dumps(body).encode("utf-8")
+    connection.request(method, path, body=data, headers=headers or {})
+    response = connection.getresponse()
+    result = response.status, json.loads(response.read())
+    connection.close()
+    return result
+
+JSON = {"Content-Type": "application/json"}
+
+def test_submit_json(api):
+    server, backend = api
+    status, body = request(server, "POST", "/jobs", {"url": "https://example.com/v"}, JSON)
+    assert status == 202
+    assert body["jobs"][0]["url"] == "https://example.com/v"
+
+def test_plain_text_post_refused(api):
+    server, backend = api
+    status, _ = request(server, "POST", "/jobs", b'{"url": "https://example.com/v"}', {"Content-Type": "text/plain"})
+    assert status == 415
+    assert not backend.submitted
+
+def test_origin_refused(api):
+    server, backend = api
+    headers = dict(JSON, Origin="https://evil.example")
+    status, _ = request(server, "POST", "/jobs", {"url": "https://example.com/v"}, headers)
+    assert status == 403
+    assert not backend.submitted
+
+def test_foreign_host_refused(api):
+    server, backend = api
+    status, _ = request(server, "GET", "/jobs", headers={"Host": f"evil.example:{server.port}"})
+    assert status == 403
+    status, _ = request(server, "GET", "/jobs", headers={"Host": f"[::1]:{server.port}"})
+    assert status == 200
+
+def test_cancel_needs_json(api):
+    server, backend = api
+    request(server, "POST", "/jobs", {"url": "https://example.com/v"}, JSON)
+    status, _ = request(server, "POST", "/jobs/1/cancel", b"", {"Content-Type": "text/plain"})
+    assert status == 415
+    status, body = request(server, "POST", "/jobs/1/cancel", b"", JSON)
+    assert status == 200
+    assert body["status"] == "Stopped"
+
+def test_urls_must_be_a_list(api):
+    server, backend = api
+    status, _ = request(server, "POST", "/jobs", {"urls": "http://x"}, JSON)
+    assert status == 400
+    assert not backend.submitted
+
+def test_option_types_checked(api):
+    server, backend = api
+    status, body = request(server, "POST", "/jobs", {"url": "https://example.com/v", "options": {"is_playlist": "no"}}, JSON)
+    assert status == 400
+    assert "is_playlist" in body["error"]
+    status, _ = request(server, "POST", "/jobs", {"url": "https://example.com/v", "options": {"output_path": 5}}, JSON)
+    assert status == 400
+    status, _ = request(server, "POST", "/jobs", {"url": "https://example.com/v", "options": {"is_playlist": False}}, JSON)
+    assert status == 202
@@ -0,0 +1,63 @@
+from downloader_core import JobQueue
+
+SETTINGS = {"enable_workarounds": False}
+
+class FakeTask:
+    is_running = True
+    
+    def __init__(self):
+        self.released = 0
+    
+    def release_entry(self):
+        self.released += 1
+    
+    def stop(self):
+        self.is_running = False
+
+class FakeQueue(JobQueue):
+    def __init__(self, max_workers=3):
+        super().__init__(max_workers)
+        self.budget.configure(SETTINGS)
+        self.tasks = {}
+    
+    def _launch(self, job, options):
+        self.tasks[job] = FakeTask()
+    
+    def _task(self, job):
+        return self.tasks.get(job)
+
+def start_playlist(queue, url):
+    playlist = queue.queue_job(url, {"is_playlist": True}, "", SETTINGS)
+    queue.fill()
+    return playlist
+
+def test_playlist_of_already_queued_entries():
+    queue = FakeQueue()
+    first = start_playlist(queue, "https://a.example/list")
+    queue.add_entries(first, [{"url": "https://example.com/v/1"}, {"url": "https://example.com/v/2"}])
+    
+    # Both playlists start with the same video, the second one gets no entry of its own
+    second = start_playlist(queue, "https://b.example/list")
+    queue.add_entries(second, [{"url": "https://example.com/v/1"}])
+    assert second.children == []
+    assert second.progress == 0
+    assert second.status == "Downloading"
+    assert queue.tasks[second].released == 1
+    
+    queue.add_entries(second, [{"url": "https://example.com/v/3"}])
+    assert [child.url for child in second.children] == ["https://example.com/v/3"]
+
+def test_stop_all_stops_jobs_waiting_for_their_host():
+    queue = FakeQueue()
+    queue.budget.configure({"host_min_interval": 300})
+    first = queue.queue_job("https://example.com/a", {}, "", SETTINGS)
+    queue.fill()
+    second = queue.queue_job("https://example.com/b", {}, "", SETTINGS)
+    queue.fill()
+    assert queue.queue == [second]
+    
+    queue.stop_all()
+    assert not queue.tasks[first].is_running
+    assert queue.queue == []
+    assert second.status == "Stopped"
+    assert second.message == "Download stopped by user"
@@ -0,0 +1,32 @@
+import time
+
+from downloader_core import JobJournal
+
+def test_flush_persists_changes(tmp_path):
+    path = str(tmp_path / "journal.json")
+    journal = JobJournal(path)
+    journal.update("a", url="https://example.com/a", status="Queued")
+    journal.update("b", url="https://example.com/b", status="Queued")
+    journal.remove("a")
+    journal.flush()
+    assert list(JobJournal(path).jobs) == ["b"]
+
+def test_background_writer_saves_without_flush(tmp_path):
+    path = str(tmp_path / "journal.json")
+    journal = JobJournal(path, write_delay=0.05)
+    journal.update("a", url="https://example.com/a")
+    deadline = time.monotonic() + 5
+    while "a" not in JobJournal(path).jobs and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert "a" in JobJournal(path).jobs
+
+def test_queueing_many_jobs_does_not_write_each_one(tmp_path):
+    path = str(tmp_path / "journal.json")
+    journal = JobJournal(path)
+    started = time.perf_counter()
+    for i in range(2000):
+        journal.update(f"job{i}", url=f"https://example.com/{i}", status="Queued")
+    elapsed = time.perf_counter() - started
+    journal.flush()
+    assert len(JobJournal(path).jobs) == 2000
+    assert elapsed < 1.0
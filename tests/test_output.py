@@ -0,0 +1,70 @@
+import sys
+import threading
+import time
+
+from downloader_core import DownloadTask, TaskEvents
+
+class RecordingEvents(TaskEvents):
+    def __init__(self):
+        self.stages = []
+        self.errors = []
+    
+    def stage(self, stage):
+        self.stages.append(stage)
+    
+    def error(self, message):
+        self.errors.append(message)
+
+def make_task():
+    events = RecordingEvents()
+    return DownloadTask("https://example.com/v", {}, settings={}, events=events), events
+
+def test_stages_follow_output():
+    task, events = make_task()
+    for line in [
+        "[info] abc: Downloading 1 format(s): 22",
+        "[download] Destination: clip.mp4",
+        "[Merger] Merging formats into \"clip.mp4\"",
+        "[info] Writing '%(.{id,title})j' to: .download-info.jsonl"
+    ]:
+        task.handle_output_line(line)
+    # The info file is written after the download and must not send the job back to "Extracting"
+    assert events.stages == ["Extracting", "Downloading", "Merging"]
+
+def test_error_line_reported():
+    task, events = make_task()
+    task.handle_output_line("ERROR: [generic] Unable to download webpage")
+    assert events.errors == ["ERROR: [generic] Unable to download webpage"]
+
+class LogCollector(TaskEvents):
+    def __init__(self):
+        self.lines = []
+    
+    def log(self, lines):
+        self.lines.extend(lines)
+        # Delivery takes a while in real listeners (a queued signal, the runner's lock)
+        time.sleep(0)
+    
+    def progress(self, value, status, speed):
+        pass
+
+def test_log_lines_from_fragment_threads_arrive_once():
+    # Switch threads as often as possible to expose unsynchronised buffer handling
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    events = LogCollector()
+    task = DownloadTask("https://example.com/v", {}, settings={}, events=events)
+    def fragment_thread(index):
+        for i in range(2000):
+            task.log(f"{index}:{i}")
+            task.handle_progress({"status": "downloading", "downloaded_bytes": i, "total_bytes": 2000, "fragment_count": 8})
+    try:
+        threads = [threading.Thread(target=fragment_thread, args=(index,)) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    task.flush_log(force=True)
+    assert sorted(events.lines) == sorted(f"{index}:{i}" for index in range(8) for i in range(2000))
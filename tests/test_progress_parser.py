@@ -0,0 +1,77 @@
+import random
+import subprocess
+import sys
+import time
+
+import pytest
+
+from downloader_core import PROGRESS_PREFIX, LineAssembler, parse_progress_line, read_line_batches
+
+def progress_line(downloaded, total, speed="1048576.0", eta="3", index="NA", count="NA"):
+    return f"{PROGRESS_PREFIX} downloading {downloaded} {total} NA {speed} {eta} {index} {count}"
+
+def generate_log(size):
+    """A yt-dlp style log of roughly size bytes, returns (text, number of progress lines)"""
+    lines, count, length = [], 0, 0
+    while length < size:
+        if count % 50 == 0:
+            lines.append("[download] Destination: clip.f137.mp4")
+        lines.append(progress_line(count * 1024, 10 ** 9, index=count % 300, count=300))
+        count += 1
+        length += len(lines[-1]) + 1
+    return "\n".join(lines) + "\n", count
+
+def feed_chunks(text, rng):
+    assembler = LineAssembler()
+    lines, pos = [], 0
+    while pos < len(text):
+        size = rng.randint(1, 8192)
+        lines.extend(assembler.feed(text[pos:pos + size]))
+        pos += size
+    return lines + assembler.flush()
+
+def test_lines_split_across_chunks():
+    text, count = generate_log(64 * 1024)
+    lines = feed_chunks(text, random.Random(1))
+    assert lines == text.splitlines()
+    assert sum(parse_progress_line(line) is not None for line in lines) == count
+
+def test_carriage_returns_end_lines():
+    assembler = LineAssembler()
+    assert assembler.feed("[download]  10%\r[download]  20%\r") == ["[download]  10%", "[download]  20%"]
+    assert assembler.feed("done\r\nnext") == ["done"]
+    assert assembler.flush() == ["next"]
+
+def test_parse_progress_line():
+    status = parse_progress_line(progress_line(2048, 4096, eta="NA", index=3, count=10))
+    assert status == {
+        "status": "downloading", "downloaded_bytes": 2048.0, "total_bytes": 4096.0,
+        "total_bytes_estimate": None, "speed": 1048576.0, "eta": None,
+        "fragment_index": 3.0, "fragment_count": 10.0,
+    }
+    assert parse_progress_line("[download] Destination: clip.mp4") is None
+    assert parse_progress_line(f"{PROGRESS_PREFIX} downloading 1 2") is None
+
+def test_reader_delivers_lines_before_eof():
+    script = "import sys, time; print('first', flush=True); time.sleep(2); print('second')"
+    process = subprocess.Popen([sys.executable, "-c", script], stdout=subprocess.PIPE)
+    started = time.monotonic()
+    batches = read_line_batches(process.stdout)
+    try:
+        # A read can return part of a line, the first complete one must still come before the pause ends
+        first = next(lines for lines in batches if lines)
+        assert first == ["first"]
+        assert time.monotonic() - started < 1.5
+        assert [line for lines in batches for line in lines] == ["second"]
+    finally:
+        process.wait()
+
+@pytest.mark.benchmark
+def test_parse_throughput():
+    text, count = generate_log(8 * 1024 * 1024)
+    started = time.perf_counter()
+    lines = feed_chunks(text, random.Random(2))
+    parsed = sum(parse_progress_line(line) is not None for line in lines)
+    elapsed = time.perf_counter() - started
+    assert parsed == count
+    print(f"\n{len(text) / elapsed / 1024 ** 2:.1f} MiB/s, {len(lines) / elapsed:.0f} lines/s")
@@ -0,0 +1,62 @@
+import os
+import time
+
+import pytest
+
+from downloader_core import DownloadTask, TaskEvents
+
+pytest.importorskip("mutagen")
+from mutagen.id3 import APIC, ID3, TIT2, TPE1
+from mutagen.mp3 import MP3
+
+# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz, no padding: 144 * 128000 / 44100 = 417 bytes per frame
+FRAME = b"\xff\xfb\x90\x00" + bytes(413)
+FILES = 30
+INFO = {"title": "Clip", "uploader": "Channel", "upload_date": "20240102"}
+
+def make_mp3(path, frames=400):
+    with open(path, "wb") as f:
+        f.write(FRAME * frames)
+    return str(path)
+
+def make_task():
+    return DownloadTask("https://example.com/v", {}, settings={}, events=TaskEvents())
+
+def tag_in_two_saves(path, info, cover_data):
+    """The previous path: text tags saved first, then the file reopened to embed the cover"""
+    audio = MP3(path, ID3=ID3)
+    audio.add_tags()
+    audio.tags.add(TIT2(encoding=3, text=info["title"]))
+    audio.tags.add(TPE1(encoding=3, text=info["uploader"]))
+    audio.save()
+    audio = MP3(path, ID3=ID3)
+    audio.tags.add(APIC(encoding=3, mime="image/jpeg", type=3, desc="Cover", data=cover_data))
+    audio.save()
+
+def test_single_save_writes_tags_and_cover(tmp_path):
+    path = make_mp3(tmp_path / "a.mp3")
+    make_task().add_metadata(path, INFO, b"cover")
+    tags = ID3(path)
+    assert str(tags["TIT2"]) == "Clip"
+    assert str(tags["TPE1"]) == "Channel"
+    assert tags.getall("APIC")[0].data == b"cover"
+
+@pytest.mark.benchmark
+def test_tagging_throughput(tmp_path):
+    cover_data = os.urandom(100 * 1024)
+    task = make_task()
+    single = [make_mp3(tmp_path / f"single{i}.mp3") for i in range(FILES)]
+    double = [make_mp3(tmp_path / f"double{i}.mp3") for i in range(FILES)]
+    
+    started = time.perf_counter()
+    for path in single:
+        task.add_metadata(path, INFO, cover_data)
+    single_seconds = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    for path in double:
+        tag_in_two_saves(path, INFO, cover_data)
+    double_seconds = time.perf_counter() - started
+    
+    print(f"\nfiles/s: single save {FILES / single_seconds:.0f}, two saves {FILES / double_seconds:.0f}")
+    assert all(ID3(path).getall("APIC") for path in single)
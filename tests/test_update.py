@@ -0,0 +1,49 @@
+import os
+import stat
+import sys
+
+import pytest
+
+from downloader_core import YTDLP_UPDATED, update_ytdlp
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="stub script is a POSIX shell script")
+
+def install_stub(tmp_path, monkeypatch, output, returncode=0):
+    """Put a fake yt-dlp that prints output and exits with returncode first on PATH"""
+    stub = tmp_path / "yt-dlp"
+    lines = "".join(f"echo '{line}'\n" for line in output)
+    stub.write_text(f"#!/bin/sh\n{lines}exit {returncode}\n")
+    stub.chmod(stub.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ.get('PATH', '')}")
+
+def test_update_detected(tmp_path, monkeypatch):
+    install_stub(tmp_path, monkeypatch, [
+        "Current version: stable@2024.07.25 from yt-dlp/yt-dlp",
+        "Latest version: stable@2024.08.06 from yt-dlp/yt-dlp",
+        "Current Build Hash: 0123456789abcdef",
+        "Updating to stable@2024.08.06 from yt-dlp/yt-dlp ...",
+        "Updated yt-dlp to stable@2024.08.06 from yt-dlp/yt-dlp"
+    ])
+    lines = []
+    assert update_ytdlp(lines.append) == (True, YTDLP_UPDATED)
+    assert lines[-1] == "Updated yt-dlp to stable@2024.08.06 from yt-dlp/yt-dlp"
+
+def test_up_to_date(tmp_path, monkeypatch):
+    install_stub(tmp_path, monkeypatch, [
+        "Latest version: stable@2024.08.06 from yt-dlp/yt-dlp",
+        "yt-dlp is up to date (stable@2024.08.06 from yt-dlp/yt-dlp)"
+    ])
+    assert update_ytdlp() == (True, "yt-dlp is up to date")
+
+def test_failed_update(tmp_path, monkeypatch):
+    install_stub(tmp_path, monkeypatch, [
+        "Updating to stable@2024.08.06 from yt-dlp/yt-dlp ...",
+        "ERROR: Unable to write to /usr/bin/yt-dlp; try running as administrator"
+    ], returncode=1)
+    assert update_ytdlp() == (False, "Could not check for updates")
+
+def test_missing_binary(tmp_path, monkeypatch):
+    monkeypatch.setenv("PATH", str(tmp_path))
+    success, message = update_ytdlp()
+    assert not success
+    assert message.startswith("Update check failed")
@@ -0,0 +1,2347 @@
+"""Qt-free download pipeline shared by the GUI (regui.py) and the headless CLI (headless.py)
+
+Everything needed to turn a URL and a set of options into published, tagged
+files lives here: yt-dlp argument building, progress parsing, staging and
+publishing, metadata tagging and the per-host scheduling rules.
+"""
+import os
+import sys
+import subprocess
+import codecs
+import contextlib
+import errno
+import hashlib
+import io
+import ipaddress
+import json
+import locale
+import re
+import shutil
+import time
+import tempfile
+import threading
+from urllib.parse import urlparse
+
+# yt_dlp, mutagen, PIL and requests are only needed once a job runs, they are
+# imported on first use to keep them off the startup path
+
+# Fields recorded for every finished file so tagging needs no second extraction
+INFO_TEMPLATE = "%(.{id,extractor_key,title,uploader,upload_date,thumbnail,filepath})j"
+INFO_FILE_NAME = ".download-info.jsonl"
+ARCHIVE_LIST_NAME = ".download-archive.txt"
+STAGING_DIR_NAME = ".yt-dlp-gui-staging"
+# Listed playlist entries that may wait in the queue before the listing pauses
+PLAYLIST_BUFFER = 50
+
+# Fragment and chunk options per format profile, sizes in yt-dlp notation (e.g. 10M), empty means unset
+FRAGMENT_DEFAULTS = {
+    "concurrent_fragments": 4,
+    "http_chunk_size": "10M",
+    "throttled_rate": "",
+    "buffer_size": ""
+}
+FRAGMENT_SIZE_OPTIONS = (
+    ("http_chunk_size", "--http-chunk-size"),
+    ("throttled_rate", "--throttled-rate"),
+    ("buffer_size", "--buffer-size")
+)
+SIZE_PATTERN = r"\d+(\.\d+)?[KkMmGg]?"
+# Fragment concurrency levels the auto-tuner tries on the first downloads of a host
+FRAGMENT_CANDIDATES = (1, 4, 8, 16)
+
+# Worker events are coalesced to at most one per interval, log lines sent in batches
+EVENT_INTERVAL = 0.1
+LOG_BATCH_LINES = 200
+STAGE_PREFIXES = {
+    "[info]": "Extracting",
+    "[download]": "Downloading",
+    "[Merger]": "Merging",
+    "[ExtractAudio]": "Extracting audio",
+    "[VideoConvertor]": "Converting",
+    "[VideoRemuxer]": "Remuxing",
+    "[Metadata]": "Writing metadata",
+    "[EmbedThumbnail]": "Embedding thumbnail",
+    "[FixupM3u8]": "Fixing up",
+    "[FixupM4a]": "Fixing up"
+}
+
+# Machine readable progress lines requested from the yt-dlp subprocess
+PROGRESS_PREFIX = "[progress]"
+PROGRESS_FIELDS = (
+    "status", "downloaded_bytes", "total_bytes", "total_bytes_estimate",
+    "speed", "eta", "fragment_index", "fragment_count"
+)
+PROGRESS_TEMPLATE = "download:" + " ".join(
+    [PROGRESS_PREFIX] + [f"%(progress.{field})s" for field in PROGRESS_FIELDS]
+)
+
+# aria2c console readout, e.g. "[#2089b0 1.2MiB/10MiB(12%) CN:8 DL:3.4MiB ETA:2s]"
+ARIA2C_PROGRESS_RE = re.compile(
+    r"\[#\w+ (?P<downloaded>[\d.]+[KMGT]?i?B)/(?P<total>[\d.]+[KMGT]?i?B)(?:\(\d+%\))?"
+    r"(?: CN:\d+)?(?: DL:(?P<speed>[\d.]+[KMGT]?i?B))?(?: ETA:(?P<eta>[\dhms]+))?\]"
+)
+ARIA2C_SEGMENTS = 8
+# Frame of the periodic aria2c summary around the readout line, not worth logging
+ARIA2C_SUMMARY_PREFIXES = (" *** Download Progress Summary", "=" * 20, "-" * 20, "FILE: ")
+SIZE_UNITS = {"B": 1, "KiB": 1024, "MiB": 1024 ** 2, "GiB": 1024 ** 3, "TiB": 1024 ** 4}
+
+class LineAssembler:
+    """Reassembles complete lines from output read in arbitrarily sized chunks"""
+    def __init__(self):
+        self._partial = ""
+    
+    def feed(self, chunk):
+        """Return the lines completed by chunk, keeping any unterminated tail for later"""
+        data = self._partial + chunk
+        if "\r" in data:
+            data = data.replace("\r\n", "\n").replace("\r", "\n")
+        lines = data.split("\n")
+        self._partial = lines.pop()
+        return lines
+    
+    def flush(self):
+        partial, self._partial = self._partial, ""
+        return [partial] if partial else []
+
+def read_line_batches(stream, encoding=None):
+    """Yield the complete lines of a binary pipe as they arrive, one list per read
+    
+    read1 returns what is available instead of waiting for a full chunk, so slow
+    writers such as aria2c's once-a-second readout are seen without delay.
+    """
+    assembler = LineAssembler()
+    decoder = codecs.getincrementaldecoder(encoding or locale.getpreferredencoding(False))(errors="replace")
+    while True:
+        data = stream.read1(4096)
+        if not data:
+            break
+        yield assembler.feed(decoder.decode(data))
+    yield assembler.feed(decoder.decode(b"", final=True)) + assembler.flush()
+
+def parse_progress_line(line):
+    """Parse a PROGRESS_TEMPLATE line into a progress hook style dictionary, None for other lines"""
+    if not line.startswith(PROGRESS_PREFIX):
+        return None
+    values = line[len(PROGRESS_PREFIX):].split()
+    if len(values) != len(PROGRESS_FIELDS):
+        return None
+    
+    status = {"status": values[0]}
+    for field, value in zip(PROGRESS_FIELDS[1:], values[1:]):
+        try:
+            status[field] = None if value == "NA" else float(value)
+        except ValueError:
+            status[field] = None
+    return status
+
+def parse_aria2c_line(line):
+    """Parse an aria2c readout line into a progress hook style dictionary, None for other lines"""
+    if not line.startswith("[#"):
+        return None
+    match = ARIA2C_PROGRESS_RE.search(line)
+    if match is None:
+        return None
+    
+    def size(text):
+        number = text.rstrip("KMGTiB")
+        return float(number) * SIZE_UNITS.get(text[len(number):], 1)
+    
+    eta = None
+    if match.group("eta"):
+        eta = sum(
+            int(value) * {"h": 3600, "m": 60, "s": 1}[unit]
+            for value, unit in re.findall(r"(\d+)([hms])", match.group("eta"))
+        )
+    return {
+        "status": "downloading",
+        "downloaded_bytes": size(match.group("downloaded")),
+        "total_bytes": size(match.group("total")),
+        "speed": size(match.group("speed")) if match.group("speed") else None,
+        "eta": eta
+    }
+
+def fragment_profile(settings, format_option):
+    """Fragment and chunk options of a format profile, defaults filled in"""
+    profile = dict(FRAGMENT_DEFAULTS)
+    profile.update(settings.get("fragment_profiles", {}).get(format_option, {}))
+    return profile
+
+def fragment_args(profile, concurrency=None):
+    """yt-dlp arguments for a fragment profile, an auto-tuned concurrency overrides the profile's"""
+    args = []
+    concurrency = int(concurrency or profile.get("concurrent_fragments") or 1)
+    if concurrency > 1:
+        args.extend(["--concurrent-fragments", str(concurrency)])
+    for key, flag in FRAGMENT_SIZE_OPTIONS:
+        value = str(profile.get(key) or "").strip()
+        # yt-dlp exits on malformed sizes, which would take the in-process engine down with it
+        if value and re.fullmatch(SIZE_PATTERN, value):
+            args.extend([flag, value])
+    return args
+
+def job_key(url, options):
+    """Stable identifier of a job, used for its journal entry and resumable staging directory"""
+    payload = json.dumps([url, options], sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+class JobJournal:
+    """Crash-safe record of unfinished download jobs
+    
+    Changes are kept in memory and written atomically by a background thread shortly after
+    they happen, so queueing a long list costs one write instead of one per job. Call flush()
+    before exiting to write what is still pending.
+    """
+    WRITE_DELAY = 0.5
+    
+    def __init__(self, path, write_delay=WRITE_DELAY):
+        self.path = path
+        self.write_delay = write_delay
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._write_lock = threading.Lock()
+        self._dirty = False
+        self._writer = None
+        self.jobs = self._load()
+    
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                jobs = json.load(f)
+            return jobs if isinstance(jobs, dict) else {}
+        except (OSError, ValueError):
+            return {}
+    
+    def _save(self, data):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+    
+    def _mark_changed(self):
+        """Schedule a write, the caller holds the lock"""
+        self._dirty = True
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="job-journal", daemon=True)
+            self._writer.start()
+        self._changed.notify()
+    
+    def _write_loop(self):
+        while True:
+            with self._lock:
+                while not self._dirty:
+                    self._changed.wait()
+            # Let a burst of changes settle into a single write
+            time.sleep(self.write_delay)
+            self.flush()
+    
+    def flush(self):
+        """Write pending changes now"""
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                self._dirty = False
+                data = json.dumps(self.jobs, indent=2)
+            try:
+                self._save(data)
+            except OSError:
+                pass  # The journal is best effort, downloads must not fail because of it
+    
+    def update(self, key, **fields):
+        with self._lock:
+            entry = self.jobs.setdefault(key, {})
+            entry.update(fields)
+            entry["updated"] = time.time()
+            self._mark_changed()
+    
+    def remove(self, key):
+        with self._lock:
+            if self.jobs.pop(key, None) is not None:
+                self._mark_changed()
+    
+    def unfinished(self, resumable=True):
+        """Journaled jobs; entries of a playlist that is unfinished itself are left out when only
+        resumable jobs are asked for, resuming the playlist lists them again"""
+        with self._lock:
+            return [
+                dict(entry, key=key) for key, entry in self.jobs.items()
+                if not (resumable and entry.get("parent") in self.jobs)
+            ]
+
+class _EngineLogger:
+    """Routes yt-dlp log messages to the job currently using the engine"""
+    def __init__(self, engine):
+        self.engine = engine
+    
+    def debug(self, message):
+        if self.engine.job is not None:
+            self.engine.job.engine_output(message)
+    
+    info = debug
+    warning = debug
+    error = debug
+
+class InProcessEngine:
+    """A yt_dlp.YoutubeDL instance that is reused for many jobs with the same options"""
+    def __init__(self, args):
+        import yt_dlp
+        
+        self.key = tuple(args)
+        self.job = None
+        
+        params = yt_dlp.parse_options(list(args)).ydl_opts
+        params["logger"] = _EngineLogger(self)
+        params["progress_hooks"] = [self._progress_hook]
+        # Progress is reported through the hook, not as log lines
+        params["noprogress"] = True
+        self.ydl = yt_dlp.YoutubeDL(params)
+    
+    def _progress_hook(self, status):
+        if self.job is not None:
+            self.job.engine_progress(status)
+    
+    def download(self, job, url, output_template, info_file, archive=None, info_json=None):
+        """Download a single URL for the given job, returns the yt-dlp exit code
+        
+        With info_json, a previously probed info dict is processed instead of extracting
+        the URL again; yt-dlp falls back to the URL if its media links have expired.
+        """
+        from yt_dlp.utils import DownloadCancelled, DownloadError, ExistingVideoReached
+        
+        self.job = job
+        self.ydl.params["outtmpl"]["default"] = output_template
+        self.ydl.params["print_to_file"] = {"after_move": [[INFO_TEMPLATE, info_file]]}
+        # A set-like archive is consulted as is, yt-dlp only reads and appends files for paths
+        self.ydl.params["download_archive"] = archive
+        self.ydl.archive = archive if archive is not None else set()
+        self.ydl._download_retcode = 0
+        try:
+            if info_json:
+                return self.ydl.download_with_info_file(info_json)
+            return self.ydl.download([url])
+        except ExistingVideoReached:
+            # Same exit code as the yt-dlp command line for --break-on-existing
+            return 101
+        except DownloadCancelled:
+            return 1
+        except DownloadError:
+            # The error itself has already been reported through the logger
+            return 1
+        finally:
+            self.job = None
+    
+    def probe(self, job, url):
+        """Extract a URL without downloading, returns the sanitized info dict or None"""
+        from yt_dlp.utils import DownloadError
+        
+        self.job = job
+        try:
+            return self.ydl.sanitize_info(self.ydl.extract_info(url, download=False))
+        except DownloadError:
+            return None
+        finally:
+            self.job = None
+    
+    def open_playlist(self, job, url):
+        """Resolve a URL to a playlist without listing it, returns (title, lazy entries) or None
+        
+        The engine stays attached to the job while the entries are consumed, listing pages
+        are only fetched as the iteration reaches them.
+        """
+        from yt_dlp.utils import DownloadError, PagedList, PlaylistEntries
+        
+        self.job = job
+        try:
+            info = self.ydl.extract_info(url, download=False, process=False)
+            # Channels and similar URLs point at the actual playlist through url results
+            while info and info.get("_type") in ("url", "url_transparent"):
+                info = self.ydl.extract_info(info["url"], ie_key=info.get("ie_key"), download=False, process=False)
+        except DownloadError:
+            return None
+        if not info or info.get("_type") not in ("playlist", "multi_video"):
+            return None
+        
+        entries = info.get("entries") or []
+        if isinstance(entries, PagedList):
+            entries = (entry for _, entry in PlaylistEntries(self.ydl, info)[:])
+        return info.get("title") or url, entries
+
+class YoutubeDLPool:
+    """Thread-safe pool of idle in-process engines keyed by their option arguments"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = {}
+    
+    def acquire(self, args):
+        with self._lock:
+            idle = self._idle.get(tuple(args))
+            if idle:
+                return idle.pop()
+        return InProcessEngine(args)
+    
+    def release(self, engine):
+        engine.job = None
+        with self._lock:
+            self._idle.setdefault(engine.key, []).append(engine)
+    
+    def clear(self):
+        with self._lock:
+            self._idle.clear()
+
+ENGINE_POOL = YoutubeDLPool()
+
+def app_cache_dir():
+    """Per-user cache directory of the application"""
+    base = (os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME")
+            or os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "yt-dlp-gui")
+
+class ThumbnailCache:
+    """Size-bounded on-disk LRU cache of processed cover JPEGs keyed by video id and size"""
+    def __init__(self, cache_dir, max_bytes=50 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+    
+    def _path(self, video_key, size):
+        safe_key = re.sub(r'[^\w.-]', '_', video_key)
+        return os.path.join(self.cache_dir, f"{safe_key}_{size[0]}x{size[1]}.jpg")
+    
+    def get(self, video_key, size):
+        if self.max_bytes <= 0:
+            return None
+        path = self._path(video_key, size)
+        with self._lock:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                # Mark as recently used
+                os.utime(path)
+                return data
+            except OSError:
+                return None
+    
+    def put(self, video_key, size, data):
+        if self.max_bytes <= 0 or len(data) > self.max_bytes:
+            return
+        path = self._path(video_key, size)
+        with self._lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+            self._evict()
+    
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(".jpg"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session(settings=None):
+    """Shared keep-alive session used for all auxiliary HTTP requests (thumbnails, metadata lookups)"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter, Retry
+            
+            settings = settings or {}
+            pool_size = settings.get("http_pool_size", 8)
+            retry = Retry(
+                total=settings.get("http_retries", 3),
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET", "HEAD")
+            )
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http_session = session
+        return _http_session
+
+def reset_http_session():
+    """Drop the shared session so the next request picks up changed pool settings"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is not None:
+            _http_session.close()
+            _http_session = None
+
+THUMBNAIL_SIZE = (500, 500)
+THUMBNAIL_CACHE = ThumbnailCache(os.path.join(app_cache_dir(), "thumbnails"))
+
+ARCHIVE_FILE = "download_archive.sqlite3"
+
+def archive_id(extractor_key, video_id):
+    """Archive key of a video, the same string yt-dlp writes to --download-archive files"""
+    return f"{extractor_key.lower()} {video_id}"
+
+def archive_profile(options):
+    """Items count as downloaded per output profile, an MP3 does not satisfy a 1080p request"""
+    format_option = options.get("format", "Best Quality")
+    if "Audio Only" in format_option:
+        return f"{format_option}|{options.get('audio_quality', '192KBPS')}"
+    return f"{format_option}|{options.get('container', 'MP4')}"
+
+class DownloadArchive:
+    """SQLite record of every published file: archive id, profile, output path and content hash
+    
+    An item counts as downloaded only in the directory its file was published to, and only
+    while that file still exists.
+    """
+    def __init__(self, path):
+        import sqlite3
+        
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS downloads ("
+                "archive_id TEXT NOT NULL, profile TEXT NOT NULL, path TEXT NOT NULL, "
+                "sha256 TEXT, size INTEGER, downloaded REAL, "
+                "PRIMARY KEY (archive_id, profile, path))"
+            )
+    
+    def contains(self, archive_id, profile, directory):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path FROM downloads WHERE archive_id = ? AND profile = ?",
+                (archive_id, profile)
+            ).fetchall()
+        return any(archived_in(row[0], directory) for row in rows)
+    
+    def ids(self, profile, directory):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT archive_id, path FROM downloads WHERE profile = ?", (profile,)
+            ).fetchall()
+        return sorted({row[0] for row in rows if archived_in(row[1], directory)})
+    
+    def record(self, archive_id, profile, path, sha256, size):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?, ?)",
+                (archive_id, profile, path, sha256, size, time.time())
+            )
+    
+    def view(self, profile, directory):
+        return ArchiveView(self, profile, directory)
+
+def archived_in(path, directory):
+    """Whether an archived file is still there, inside the given output directory"""
+    try:
+        if os.path.commonpath([path, directory]) != directory:
+            return False
+    except ValueError:
+        return False  # Different drives
+    return os.path.exists(path)
+
+class ArchiveView:
+    """Set-like view of one profile and output directory of the archive, used by YoutubeDL as its download archive"""
+    def __init__(self, archive, profile, directory):
+        self.archive = archive
+        self.profile = profile
+        self.directory = directory
+        self.added = set()
+    
+    def __contains__(self, archive_id):
+        return archive_id in self.added or self.archive.contains(archive_id, self.profile, self.directory)
+    
+    def __bool__(self):
+        return True
+    
+    def add(self, archive_id):
+        # Only remembered for this run, the archive records files once they are published
+        self.added.add(archive_id)
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+def get_archive(settings):
+    """Shared DownloadArchive for the configured file, None when the archive is disabled"""
+    if not settings.get("use_download_archive", True):
+        return None
+    path = os.path.abspath(settings.get("download_archive") or ARCHIVE_FILE)
+    with _archives_lock:
+        if path not in _archives:
+            _archives[path] = DownloadArchive(path)
+        return _archives[path]
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Probed info dicts are reused for this long by default; their signed media URLs expire after hours
+INFO_CACHE_MINUTES = 30
+INFO_CACHE_MAX_AGE = 6 * 3600
+
+class InfoCache:
+    """On-disk cache of probed info dicts, so a download right after a probe skips the extraction
+    
+    Entries are stored per extractor and video id and found by URL through an index.
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+    
+    def put(self, url, info):
+        """Store a sanitized info dict under its extractor and id, returns the file path"""
+        key = archive_id(info.get("extractor_key") or info.get("extractor") or "", info.get("id") or url)
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + ".info.json"
+        path = os.path.join(self.cache_dir, name)
+        with self._lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(info, f)
+            os.replace(temp_path, path)
+            
+            index = self._load_index()
+            entry = {"file": name, "key": key, "time": time.time()}
+            for entry_url in {url, info.get("webpage_url") or url}:
+                index[entry_url] = entry
+            self._prune(index)
+            self._save_index(index)
+        return path
+    
+    def path(self, url, max_age):
+        """File of a cached info dict for the URL that is at most max_age seconds old, or None"""
+        if max_age <= 0:
+            return None
+        with self._lock:
+            entry = self._load_index().get(url)
+        if entry is None or time.time() - entry["time"] > max_age:
+            return None
+        path = os.path.join(self.cache_dir, entry["file"])
+        return path if os.path.exists(path) else None
+    
+    def _prune(self, index):
+        """Forget entries no download could use anymore and delete their files"""
+        now = time.time()
+        for entry_url in [u for u, entry in index.items() if now - entry["time"] > INFO_CACHE_MAX_AGE]:
+            del index[entry_url]
+        used = {entry["file"] for entry in index.values()}
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".info.json") and entry.name not in used:
+                with contextlib.suppress(OSError):
+                    os.remove(entry.path)
+    
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.cache_dir, "urls.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_index(self, index):
+        index_path = os.path.join(self.cache_dir, "urls.json")
+        with open(f"{index_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(f"{index_path}.tmp", index_path)
+
+INFO_CACHE = InfoCache(os.path.join(app_cache_dir(), "info"))
+
+def format_table(info):
+    """Readable list of the formats in an info dict, for choosing between the format presets"""
+    lines = [f"Formats of {info.get('title') or info.get('webpage_url')}:"]
+    heights = set()
+    for f in info.get("formats") or []:
+        # A missing codec is unknown, "none" means the stream is absent
+        vcodec = f.get("vcodec") or ""
+        acodec = f.get("acodec") or ""
+        if f.get("ext") == "mhtml":
+            continue  # Storyboards
+        if vcodec != "none" and f.get("height"):
+            heights.add(int(f["height"]))
+        size = f.get("filesize") or f.get("filesize_approx")
+        lines.append("  {:>12} {:<5} {:>11} {:>5} {:<14} {:<12} {:>10}".format(
+            str(f.get("format_id", "")),
+            str(f.get("ext", "")),
+            "audio only" if vcodec == "none" else f"{f['width']}x{f['height']}" if f.get("width") and f.get("height") else "",
+            f"{f['fps']:g}" if f.get("fps") else "",
+            vcodec.split(".")[0] if vcodec != "none" else "",
+            acodec.split(".")[0] if acodec != "none" else "",
+            f"{size / 1048576:.1f}MiB" if size else ""
+        ))
+    if heights:
+        lines.append("Video heights: " + ", ".join(f"{height}p" for height in sorted(heights, reverse=True)))
+    return lines
+
+def find_ffmpeg_binary(path):
+    """Return the first FFmpeg executable found in a directory, or None"""
+    if not path:
+        return None
+        
+    required_files = ["ffmpeg", "ffprobe"]
+    for file in required_files:
+        for ext in ["", ".exe", ".bat"]:
+            full_path = os.path.join(path, file + ext)
+            if os.path.exists(full_path):
+                return full_path
+    return None
+
+def validate_ffmpeg_dir(path):
+    """Verify if FFmpeg directory contains necessary executables"""
+    return find_ffmpeg_binary(path) is not None
+
+# Bumped whenever the probe looks for something new, older cached results lack it
+DEPENDENCY_CACHE_VERSION = 2
+
+class DependencyCheck:
+    """Looks for yt-dlp, FFmpeg and the optional aria2c
+
+    The result is cached on disk and reused while PATH, the configured FFmpeg
+    directory and the modification times of the found binaries are unchanged.
+    """
+    def __init__(self, ffmpeg_dir="", cache_path=None):
+        self.ffmpeg_dir = ffmpeg_dir
+        self.cache_path = cache_path or os.path.join(app_cache_dir(), "dependencies.json")
+    
+    def run(self):
+        """Return the cached result if still valid, otherwise probe again"""
+        key = {
+            "path": os.environ.get("PATH", ""),
+            "ffmpeg_dir": self.ffmpeg_dir,
+            "frozen": bool(getattr(sys, 'frozen', False)),
+            "version": DEPENDENCY_CACHE_VERSION
+        }
+        cached = self._load()
+        if cached and cached.get("key") == key and self._unchanged(cached.get("mtimes", {})):
+            return cached["result"]
+        
+        result, mtimes = self.probe()
+        self._save({"key": key, "mtimes": mtimes, "result": result})
+        return result
+    
+    def probe(self):
+        """Run the full lookup, returns the result and the mtimes it depends on"""
+        messages = []
+        mtimes = {}
+        result = {"messages": messages, "ffmpeg_path": "", "ytdlp_version": "", "aria2c_path": ""}
+        
+        # Optional external downloader, looked up first since FFmpeg lookups return early
+        aria2c_binary = shutil.which("aria2c")
+        if aria2c_binary:
+            self._record(mtimes, aria2c_binary)
+            result["aria2c_path"] = aria2c_binary
+            messages.append(f"aria2c found: {aria2c_binary}")
+        else:
+            # Installing aria2c into a PATH directory changes its mtime
+            for dir_path in os.get_exec_path():
+                self._record(mtimes, dir_path)
+        
+        # Handle frozen app paths
+        if getattr(sys, 'frozen', False):
+            base_path = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
+            ffmpeg_path = os.path.join(base_path, "ffmpeg")
+            binary = find_ffmpeg_binary(ffmpeg_path)
+            if binary:
+                self._record(mtimes, binary)
+                messages.append(f"Using bundled FFmpeg in: {ffmpeg_path}")
+                return result, mtimes
+        
+        # Check yt-dlp installation
+        ytdlp_binary = shutil.which("yt-dlp")
+        if ytdlp_binary:
+            self._record(mtimes, ytdlp_binary)
+        else:
+            # Installing yt-dlp into a PATH directory changes its mtime
+            for dir_path in os.get_exec_path():
+                self._record(mtimes, dir_path)
+        try:
+            process = subprocess.run(
+                ["yt-dlp", "--version"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+            )
+            if process.returncode == 0:
+                result["ytdlp_version"] = process.stdout.strip()
+                messages.append(f"yt-dlp version: {result['ytdlp_version']}")
+            else:
+                messages.append("Warning: yt-dlp not found. Please install it.")
+        except Exception as e:
+            messages.append(f"Error checking yt-dlp: {str(e)}")
+        
+        # Check FFmpeg installation
+        binary = find_ffmpeg_binary(self.ffmpeg_dir)
+        if binary:
+            self._record(mtimes, binary)
+            messages.append(f"FFmpeg found in: {self.ffmpeg_dir}")
+            return result, mtimes
+        
+        # Search common paths for FFmpeg
+        app_dir = os.path.dirname(os.path.abspath(__file__))
+        possible_dirs = [
+            os.path.join(app_dir, "ffmpeg"),
+            os.path.join(app_dir, "ffmpeg", "bin"),
+            os.path.join(app_dir, "bin"),
+            os.path.join(app_dir)
+        ]
+        
+        for dir_path in os.get_exec_path():
+            possible_dirs.append(dir_path)
+        
+        for dir_path in possible_dirs:
+            binary = find_ffmpeg_binary(dir_path)
+            if binary:
+                self._record(mtimes, binary)
+                result["ffmpeg_path"] = dir_path
+                messages.append(f"Using FFmpeg in: {dir_path}")
+                return result, mtimes
+        
+        # Nothing found, installing FFmpeg into a searched directory changes its mtime.
+        # The app directory itself is skipped, settings and logs are written there.
+        for dir_path in possible_dirs:
+            if dir_path != app_dir:
+                self._record(mtimes, dir_path)
+        messages.append("Warning: FFmpeg directory not found or incomplete. Some formats may not work properly.")
+        messages.append("FFmpeg directory must contain both ffmpeg and ffprobe executables")
+        return result, mtimes
+    
+    def _record(self, mtimes, path):
+        if not path:
+            return
+        try:
+            mtimes[path] = os.stat(path).st_mtime
+        except OSError:
+            pass
+    
+    def _unchanged(self, mtimes):
+        for path, mtime in mtimes.items():
+            try:
+                if os.stat(path).st_mtime != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+    
+    def _load(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _save(self, data):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            temp_path = f"{self.cache_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.cache_path)
+        except OSError:
+            pass  # The probe still works without a cache
+    
+    def invalidate(self):
+        """Forget the cached result, e.g. after yt-dlp replaced itself"""
+        with contextlib.suppress(OSError):
+            os.remove(self.cache_path)
+
+YTDLP_UPDATED = "yt-dlp has been updated"
+
+def update_ytdlp(on_line=None):
+    """Run `yt-dlp -U`, handing each output line to on_line, returns (success, message)"""
+    try:
+        process = subprocess.Popen(
+            ["yt-dlp", "-U"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+        )
+    except OSError as e:
+        return False, f"Update check failed: {str(e)}"
+    
+    output = []
+    for line in process.stdout:
+        line = line.rstrip()
+        output.append(line)
+        if on_line is not None:
+            on_line(line)
+    returncode = process.wait()
+    
+    # yt-dlp prints "Updated yt-dlp to stable@2024.08.06 from ..." or "yt-dlp is up to date (...)"
+    output = "\n".join(output)
+    if returncode != 0:
+        return False, "Could not check for updates"
+    if "Updated yt-dlp to" in output:
+        return True, YTDLP_UPDATED
+    if "is up to date" in output:
+        return True, "yt-dlp is up to date"
+    return False, "Could not check for updates"
+
+class TaskEvents:
+    """Receives the typed, rate-limited events of a DownloadTask; raw log lines arrive in batches"""
+    def progress(self, value, line, speed):
+        pass
+    
+    def stage(self, stage):
+        pass
+    
+    def file(self, path):
+        pass
+    
+    def entries(self, entries):
+        pass
+    
+    def error(self, message):
+        pass
+    
+    def log(self, lines):
+        pass
+    
+    def finished(self, success, message):
+        pass
+
+class DownloadTask:
+    """Downloads, publishes and tags a single job, reporting through a TaskEvents listener"""
+    def __init__(self, url, options, ffmpeg_dir=None, settings=None, journal=None, key=None, events=None):
+        self.url = url
+        self.options = options
+        self.ffmpeg_dir = ffmpeg_dir
+        self.settings = settings or {}
+        self.journal = journal
+        self.key = key
+        self.events = events or TaskEvents()
+        self.is_running = True
+        self.downloaded_files = []
+        self.archived_skips = 0
+        self._aria2c = None
+        self.fragment_bytes = 0
+        self.fragment_time = 0.0
+        self._fragment_mark = None
+        self.entry_slots = threading.BoundedSemaphore(max(1, self.settings.get("playlist_buffer", PLAYLIST_BUFFER)))
+        self.staging_done = False
+        self.stage = ""
+        self._last_journal_time = 0.0
+        self._last_progress_time = 0.0
+        self._log_buffer = []
+        self._last_log_flush = 0.0
+        # The in-process engine logs and reports progress from its fragment download threads
+        self._output_lock = threading.RLock()
+    
+    def build_args(self, select_format=True):
+        """Translate the job options into yt-dlp command line arguments (without URL and output template)
+        
+        Without select_format the format preset is left out, so every format can be listed.
+        """
+        args = []
+        
+        # Add verbosity options
+        verbosity_map = {
+            "Quiet": ["--quiet"],
+            "Verbose": ["--verbose"],
+            "Debug": ["--verbose", "--dump-pages"]
+        }
+        verbosity = self.settings.get("verbosity", "Normal")
+        if verbosity in verbosity_map:
+            args.extend(verbosity_map[verbosity])
+        
+        # Add simulation mode
+        if self.settings.get("simulate", False):
+            args.extend(["--simulate", "--no-download"])
+        
+        # Add workaround options
+        # Spacing between downloads of the same host is enforced by the scheduler's HostBudget
+        if self.settings.get("enable_workarounds", True):
+            args.append("--force-ipv4")
+            sleep_requests = self.options.get("sleep_requests", 1)
+            if sleep_requests:
+                args.extend(["--sleep-requests", str(sleep_requests)])
+        
+        # Add error handling
+        if self.settings.get("ignore_errors", False):
+            args.extend(["--ignore-errors"])
+        
+        # Keep partial files around only when they can be resumed later
+        if self.resumable():
+            args.extend(["--continue", "--part"])
+        else:
+            args.extend(["--no-continue", "--no-part"])
+        
+        # Add optimized download options
+        args.extend([
+            "--console-title",
+            "--no-cache-dir",
+            "--retries", "10",
+            "--fragment-retries", "10",
+            "--socket-timeout", "30"
+        ])
+        
+        # Enhanced format selection
+        format_map = {
+            "Best Quality": ["-f", "bestvideo+bestaudio/best"],
+            "1080p": ["-f", "bestvideo[height<=1080]+bestaudio/best[height<=1080]"],
+            "720p": ["-f", "bestvideo[height<=720]+bestaudio/best[height<=720]"],
+            "480p": ["-f", "bestvideo[height<=480]+bestaudio/best[height<=480]"],
+            "360p": ["-f", "bestvideo[height<=360]+bestaudio/best[height<=360]"],
+            "Audio Only (MP3)": ["-x", "--audio-format", "mp3"],
+            "Audio Only (OGG)": ["-x", "--audio-format", "ogg"]
+        }
+        
+        format_option = self.options.get("format", "Best Quality")
+        if select_format:
+            args.extend(format_map.get(format_option, ["-f", "bestvideo+bestaudio/best"]))
+        
+        # DASH/HLS formats are fetched over several connections
+        profile = fragment_profile(self.settings, format_option)
+        args.extend(fragment_args(profile, self.options.get("concurrent_fragments")))
+        
+        # Single-file formats can be split into segments by aria2c instead
+        if self.use_aria2c():
+            segments = max(1, min(16, self.settings.get("aria2c_segments", ARIA2C_SEGMENTS)))
+            args.extend([
+                "--downloader", "http:aria2c",
+                "--downloader-args", f"aria2c:-x {segments} -s {segments} --summary-interval=1"
+            ])
+        
+        # Add audio quality option if audio format is selected
+        if select_format and "Audio Only" in format_option:
+            quality_map = {
+                "192KBPS": ["--audio-quality", "192K"],
+                "256KBPS": ["--audio-quality", "256K"],
+                "320KBPS": ["--audio-quality", "320K"],
+                "Best": []  # Default is best quality
+            }
+            audio_quality = self.options.get("audio_quality", "192KBPS")
+            if audio_quality in quality_map:
+                args.extend(quality_map[audio_quality])
+        
+        # Add FFmpeg location if specified
+        if self.ffmpeg_dir:
+            args.extend(["--ffmpeg-location", self.ffmpeg_dir])
+        
+        # Playlist handling
+        if self.options.get("is_playlist", False):
+            args.append("--yes-playlist")
+            # Channel re-syncs only need the entries newer than the last archived one
+            if self.settings.get("use_download_archive", True) and self.settings.get("archive_break_on_existing", False):
+                args.append("--break-on-existing")
+        else:
+            args.append("--no-playlist")
+        
+        # Container options
+        if select_format and format_option not in ["Audio Only (MP3)", "Audio Only (OGG)"]:
+            container = self.options.get("container", "MP4")
+            if container != "Original":
+                args.extend(["--merge-output-format", container.lower()])
+        
+        # Metadata options
+        if format_option in ["Audio Only (MP3)", "Audio Only (OGG)"]:
+            if self.settings.get("add_metadata", True):
+                args.append("--add-metadata")
+            if self.settings.get("embed_thumbnails", True):
+                args.append("--embed-thumbnail")
+        
+        # Additional options
+        if self.options.get("write_thumbnail", False):
+            args.append("--write-thumbnail")
+        if self.options.get("write_description", False):
+            args.append("--write-description")
+        
+        return args
+    
+    def probed_info(self):
+        """Info file of a recent probe of this URL, None if it has to be extracted again"""
+        if self.options.get("is_playlist", False):
+            return None
+        max_age = self.settings.get("info_cache_minutes", INFO_CACHE_MINUTES) * 60
+        path = INFO_CACHE.path(self.url, max_age)
+        if path is not None:
+            self.log("Using the formats from the last probe, skipping extraction")
+        return path
+    
+    def probe(self):
+        """Extract the URL's formats without downloading, log them and keep the info dict for the download"""
+        self.set_stage("Probing")
+        # A playlist is only listed flat, to be turned down without extracting its entries.
+        # The format preset is left out: listing formats must not fail because the preset matches none of them
+        args = [arg for arg in self.build_args(select_format=False) if arg != "--yes-playlist"]
+        args += ["--no-playlist", "--flat-playlist"]
+        
+        info = None
+        engine = None
+        if self.settings.get("download_engine", "In-process") == "In-process":
+            try:
+                engine = ENGINE_POOL.acquire(args)
+            except ImportError:
+                pass
+        if engine is not None:
+            try:
+                info = engine.probe(self, self.url)
+            finally:
+                ENGINE_POOL.release(engine)
+        else:
+            info = self.probe_subprocess(args)
+        
+        if info is not None and info.get("_type", "video") != "video":
+            self.log("Playlists are listed when they are downloaded, only single videos can be probed")
+            info = None
+        if info is not None:
+            try:
+                INFO_CACHE.put(self.url, info)
+            except OSError as e:
+                self.log(f"Could not cache the formats: {str(e)}")
+            for line in format_table(info):
+                self.log(line)
+        self.flush_log(force=True)
+        return info
+    
+    def probe_subprocess(self, args):
+        """Probe through `yt-dlp -J`, returns the info dict or None"""
+        cmd = ["yt-dlp", self.url] + args + ["-J"]
+        try:
+            process = subprocess.run(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding="utf-8",
+                creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+            )
+        except OSError as e:
+            self.log(f"Error starting process: {str(e)}")
+            return None
+        for line in process.stderr.splitlines():
+            self.handle_output_line(line)
+        if process.returncode != 0:
+            return None
+        try:
+            return json.loads(process.stdout)
+        except ValueError:
+            return None
+    
+    def use_aria2c(self):
+        """Whether aria2c is selected as downloader and can be found"""
+        if self._aria2c is None:
+            self._aria2c = (self.settings.get("external_downloader", "Native") == "aria2c"
+                            and shutil.which("aria2c") is not None)
+        return self._aria2c
+    
+    def run(self):
+        try:
+            # Playlists are split into one job per entry by whoever runs the queue
+            if self.options.get("is_playlist", False) and self.settings.get("expand_playlists", True):
+                count = self.expand_playlist()
+                if not self.is_running:
+                    self.finish(False, "Download stopped by user")
+                    return
+                if count is not None:
+                    self.finish(True, f"Playlist expanded into {count} downloads")
+                    return
+            
+            # Create a staging directory for downloads
+            with self.staging_directory() as temp_dir:
+                args = self.build_args()
+                format_option = self.options.get("format", "Best Quality")
+                
+                if self.settings.get("simulate", False):
+                    self.log("SIMULATION MODE: No files will be downloaded")
+                
+                # Set output path to temp directory first
+                temp_output = os.path.join(temp_dir, "%(title)s [%(id)s].%(ext)s")
+                info_file = os.path.join(temp_dir, INFO_FILE_NAME)
+                archive = self.open_archive()
+                profile = archive_profile(self.options)
+                info_json = self.probed_info()
+                
+                if self.settings.get("external_downloader", "Native") == "aria2c" and not self.use_aria2c():
+                    self.log("aria2c was not found, using the native downloader")
+                
+                # aria2c reports its progress on the console only, which the in-process engine cannot read
+                if self.settings.get("download_engine", "In-process") == "In-process" and not self.use_aria2c():
+                    returncode = self.run_in_process(args, temp_output, info_file, archive, info_json)
+                else:
+                    returncode = self.run_subprocess(args, temp_output, info_file, archive, info_json)
+                
+                if returncode is None:
+                    return
+                if returncode == 101 and "--break-on-existing" in args:
+                    self.log("Reached an item that is already in the archive, stopping the playlist here")
+                    returncode = 0
+                
+                if not self.is_running:
+                    self.finish(False, "Download stopped by user")
+                    return
+                
+                # Handle simulation mode
+                if self.settings.get("simulate", False):
+                    self.staging_done = True
+                    self.finish(True, "Simulation completed successfully")
+                    return
+                
+                # Process downloaded files
+                if returncode == 0:
+                    final_output = self.options.get("output_path", "")
+                    if final_output:
+                        final_output = os.path.abspath(final_output)
+                        os.makedirs(final_output, exist_ok=True)
+                        
+                        # Publish files from staging to final location
+                        self.set_stage("Publishing")
+                        moved_files = []
+                        for filename in os.listdir(temp_dir):
+                            src_path = os.path.join(temp_dir, filename)
+                            dest_path = os.path.join(final_output, filename)
+                            
+                            if os.path.isdir(src_path) or filename in (INFO_FILE_NAME, ARCHIVE_LIST_NAME):
+                                continue
+                            
+                            try:
+                                self.publish_file(src_path, dest_path)
+                                moved_files.append(dest_path)
+                                self.log(f"Moved to: {dest_path}")
+                                self.events.file(dest_path)
+                            except Exception as e:
+                                self.log(f"Error moving file: {str(e)}")
+                        
+                        self.downloaded_files = moved_files
+                        if self.journal is not None:
+                            self.journal.update(self.key, output_files=moved_files)
+                    
+                    try:
+                        video_infos = self.load_video_infos(info_file)
+                    except Exception as e:
+                        self.log(f"Could not read the download info: {str(e)}")
+                        video_infos = {}
+                    
+                    # Add metadata to audio files, using the info captured during the download
+                    if format_option in ["Audio Only (MP3)", "Audio Only (OGG)"] and self.downloaded_files:
+                        self.set_stage("Tagging")
+                        try:
+                            for file_path in self.downloaded_files:
+                                video_info = video_infos.get(os.path.basename(file_path))
+                                if video_info is None:
+                                    self.log(f"No metadata captured for: {os.path.basename(file_path)}")
+                                    continue
+                                if os.path.exists(file_path):
+                                    ext = os.path.splitext(file_path)[1].lower()
+                                    if ext in ['.mp3', '.ogg']:
+                                        cover_data = None
+                                        if self.settings.get("embed_thumbnails", True):
+                                            cover_data = self.fetch_thumbnail(video_info)
+                                        self.add_metadata(file_path, video_info, cover_data)
+                        except Exception as e:
+                            self.log(f"Metadata processing error: {str(e)}")
+                    
+                    # Record finished files last, their hash must include the tags
+                    if archive is not None and self.downloaded_files:
+                        self.set_stage("Archiving")
+                        self.record_archive(archive.archive, profile, video_infos)
+                    
+                    self.staging_done = True
+                    if not self.downloaded_files and self.archived_skips:
+                        self.finish(True, "Already downloaded, found in the archive")
+                    else:
+                        self.finish(True, "Download completed successfully!")
+                else:
+                    self.finish(False, f"Download failed with code {returncode}")
+        
+        except Exception as e:
+            self.finish(False, f"Error: {str(e)}")
+        finally:
+            output_path = self.options.get("output_path", "")
+            if output_path:
+                try:
+                    os.rmdir(os.path.join(os.path.abspath(output_path), STAGING_DIR_NAME))
+                except OSError:
+                    pass  # Still in use by another job or never created
+    
+    def expand_playlist(self):
+        """Stream the entries of a playlist into the queue, returns their count or None if it is no playlist"""
+        self.set_stage("Expanding playlist")
+        # Entries are listed without extracting them, the archive is applied here instead of by yt-dlp
+        args = [arg for arg in self.build_args() if arg != "--break-on-existing"]
+        args += ["--flat-playlist", "--lazy-playlist"]
+        
+        engine = None
+        if self.settings.get("download_engine", "In-process") == "In-process":
+            try:
+                engine = ENGINE_POOL.acquire(args)
+            except ImportError:
+                pass
+        if engine is None:
+            return self.stream_entries(self.open_playlist_subprocess(args))
+        try:
+            return self.stream_entries(engine.open_playlist(self, self.url))
+        finally:
+            ENGINE_POOL.release(engine)
+    
+    def stream_entries(self, playlist):
+        """Hand playlist entries to the queue one at a time as the listing arrives"""
+        if playlist is None:
+            return None
+        title, entries = playlist
+        
+        archive = self.open_archive()
+        count = 0
+        skipped = 0
+        for entry in entries:
+            if not self.is_running:
+                break
+            if not entry:
+                continue
+            url = entry.get("url") or entry.get("webpage_url")
+            if not url:
+                continue
+            if archive is not None and entry.get("id") and entry.get("ie_key"):
+                if archive_id(entry["ie_key"], entry["id"]) in archive:
+                    skipped += 1
+                    if self.settings.get("archive_break_on_existing", False):
+                        self.log("Reached an item that is already in the archive, stopping the playlist here")
+                        break
+                    continue
+            
+            # Bounded buffer: wait until the queue has taken earlier entries before listing more
+            while self.is_running and not self.entry_slots.acquire(timeout=0.5):
+                pass
+            if not self.is_running:
+                break
+            self.events.entries([{"url": url, "title": entry.get("title") or url}])
+            count += 1
+        
+        self.log(
+            f"Playlist {title}: {count} entries queued"
+            + (f", {skipped} already in the archive" if skipped else "")
+        )
+        return count
+    
+    def track_fragments(self, status):
+        """Add up bytes and time of fragmented downloads, unthrottled, for the auto-tuner"""
+        now = time.monotonic()
+        downloaded = status.get("downloaded_bytes") or 0
+        if self._fragment_mark is not None:
+            last_time, last_bytes = self._fragment_mark
+            self.fragment_time += now - last_time
+            # Concurrent fragments make the count jitter, only growth is counted
+            self.fragment_bytes += max(0, downloaded - last_bytes)
+            downloaded = max(downloaded, last_bytes)
+        elif not status.get("fragment_count"):
+            return
+        # Each format of a merged download counts from zero again
+        self._fragment_mark = None if status.get("status") == "finished" else (now, downloaded)
+    
+    def fragment_speed(self):
+        """Average speed while fragments were downloaded, 0 if the download had none"""
+        if self.fragment_time <= 0:
+            return 0.0
+        return self.fragment_bytes / self.fragment_time
+    
+    def release_entry(self):
+        """Called by the queue when one of the listed entries has left it"""
+        self.entry_slots.release()
+    
+    def open_playlist_subprocess(self, args):
+        """Start listing through `yt-dlp -j`, returns (title, entries) like InProcessEngine.open_playlist"""
+        cmd = ["yt-dlp", self.url] + args + ["-j"]
+        self.log(f"Command: {' '.join(cmd)}\n")
+        try:
+            process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                encoding="utf-8",
+                bufsize=1,
+                creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+            )
+        except OSError as e:
+            self.log(f"Error starting process: {str(e)}")
+            return None
+        
+        def read_entries():
+            # One JSON object per entry, log lines are mixed in on the same stream
+            for line in process.stdout:
+                line = line.rstrip("\r\n")
+                if not line.startswith("{"):
+                    self.handle_output_line(line)
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    self.handle_output_line(line)
+        
+        lines = read_entries()
+        first = next(lines, None)
+        if first is None:
+            # Nothing listed: an empty playlist, or an error yt-dlp has already reported
+            return ("", ()) if process.wait() == 0 else None
+        if "playlist_index" not in first:
+            # A single video was printed, it is downloaded as usual
+            process.kill()
+            process.wait()
+            return None
+        
+        def entries():
+            try:
+                yield first
+                yield from lines
+                if process.wait() != 0 and self.is_running:
+                    raise RuntimeError("yt-dlp could not list the whole playlist")
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+        
+        return first.get("playlist_title") or first.get("playlist") or self.url, entries()
+    
+    def open_archive(self):
+        """View of the download archive for this job's profile, None if disabled or unavailable"""
+        try:
+            archive = get_archive(self.settings)
+        except Exception as e:
+            self.log(f"Download archive unavailable: {str(e)}")
+            return None
+        if archive is None:
+            return None
+        return archive.view(archive_profile(self.options), os.path.abspath(self.options.get("output_path", "")))
+    
+    def record_archive(self, archive, profile, video_infos):
+        """Add every published file with known video info to the archive"""
+        for file_path in self.downloaded_files:
+            video_info = video_infos.get(os.path.basename(file_path))
+            if not video_info or not video_info.get("id") or not video_info.get("extractor_key"):
+                continue
+            try:
+                archive.record(
+                    archive_id(video_info["extractor_key"], video_info["id"]),
+                    profile,
+                    file_path,
+                    file_sha256(file_path),
+                    os.path.getsize(file_path)
+                )
+            except Exception as e:
+                self.log(f"Archive error: {str(e)}")
+    
+    def resumable(self):
+        """Whether partial downloads are kept in a persistent staging directory"""
+        return bool(
+            self.key
+            and self.options.get("output_path")
+            and self.settings.get("stage_in_destination", True)
+            and self.settings.get("resume_downloads", True)
+        )
+    
+    @contextlib.contextmanager
+    def staging_directory(self):
+        """Directory the job downloads into, on the destination filesystem unless disabled"""
+        final_output = self.options.get("output_path", "")
+        if final_output and self.settings.get("stage_in_destination", True):
+            staging_root = os.path.join(os.path.abspath(final_output), STAGING_DIR_NAME)
+            os.makedirs(staging_root, exist_ok=True)
+            if self.resumable():
+                # Partial files survive failures and restarts, the directory goes once the job is done
+                staging_dir = os.path.join(staging_root, self.key)
+                os.makedirs(staging_dir, exist_ok=True)
+                yield staging_dir
+                if self.staging_done:
+                    shutil.rmtree(staging_dir, ignore_errors=True)
+                return
+            with tempfile.TemporaryDirectory(dir=staging_root) as staging_dir:
+                yield staging_dir
+            return
+        with tempfile.TemporaryDirectory() as staging_dir:
+            yield staging_dir
+    
+    def record_progress(self, downloaded_bytes):
+        """Store the byte count of a running job in the journal, at most every few seconds"""
+        if self.journal is None or downloaded_bytes is None:
+            return
+        current_time = time.time()
+        if current_time - self._last_journal_time >= 5:
+            self.journal.update(self.key, bytes_done=downloaded_bytes)
+            self._last_journal_time = current_time
+    
+    def publish_file(self, src_path, dest_path):
+        """Atomically replace dest_path with src_path, copying only across filesystems"""
+        try:
+            os.replace(src_path, dest_path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.move(src_path, dest_path)
+    
+    def load_video_infos(self, info_file):
+        """Read the per-file info records written during the download, keyed by file name"""
+        video_infos = {}
+        if not os.path.exists(info_file):
+            return video_infos
+        with open(info_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                video_info = json.loads(line)
+                if video_info.get("filepath"):
+                    video_infos[os.path.basename(video_info["filepath"])] = video_info
+        return video_infos
+    
+    def run_subprocess(self, args, output_template, info_file, archive=None, info_json=None):
+        """Run the job in a separate yt-dlp process, returns its exit code or None on startup failure"""
+        source = ["--load-info-json", info_json] if info_json else [self.url]
+        cmd = ["yt-dlp"] + source + args + [
+            "-o", output_template,
+            "--print-to-file", f"after_move:{INFO_TEMPLATE}", info_file,
+            "--newline",
+            "--progress-template", PROGRESS_TEMPLATE
+        ]
+        if archive is not None:
+            # The process gets this profile's archive ids as a plain --download-archive file
+            archive_list = os.path.join(os.path.dirname(info_file), ARCHIVE_LIST_NAME)
+            with open(archive_list, "w", encoding="utf-8") as f:
+                f.writelines(f"{entry}\n" for entry in archive.archive.ids(archive.profile, archive.directory))
+            cmd.extend(["--download-archive", archive_list])
+        self.log(f"Command: {' '.join(cmd)}\n")
+        
+        # Prepare process startup info
+        startupinfo = None
+        creation_flags = 0
+        if sys.platform == "win32":
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            if getattr(sys, 'frozen', False):
+                creation_flags = subprocess.CREATE_NO_WINDOW
+        
+        try:
+            process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                bufsize=8192,
+                startupinfo=startupinfo,
+                creationflags=creation_flags
+            )
+        except FileNotFoundError:
+            self.log("Error: yt-dlp not found. Please ensure it's installed.")
+            self.finish(False, "yt-dlp not installed")
+            return None
+        except Exception as e:
+            self.log(f"Error starting process: {str(e)}")
+            self.finish(False, f"Process error: {str(e)}")
+            return None
+        
+        if process.stdout is None:
+            self.log("Error: No output stream available from process")
+            self.finish(False, "No process output")
+            return None
+        
+        # Read output as it arrives, reassembling lines split across chunk boundaries
+        self._last_progress_time = 0.0
+        for lines in read_line_batches(process.stdout):
+            if not self.is_running:
+                break
+            for line in lines:
+                self.handle_output_line(line)
+            self.flush_log()
+        
+        if not self.is_running:
+            process.terminate()
+        return process.wait()
+    
+    def run_in_process(self, args, output_template, info_file, archive=None, info_json=None):
+        """Run the job on a pooled yt_dlp.YoutubeDL instance, returns the download exit code"""
+        try:
+            engine = ENGINE_POOL.acquire(args)
+        except ImportError:
+            self.log("yt_dlp module not available, falling back to the subprocess engine")
+            return self.run_subprocess(args, output_template, info_file, archive, info_json)
+        except Exception as e:
+            self.log(f"Error creating in-process engine: {str(e)}")
+            self.finish(False, f"Engine error: {str(e)}")
+            return None
+        
+        self.log(f"In-process engine: yt-dlp {' '.join(args)}\n")
+        self._last_progress_time = 0.0
+        try:
+            return engine.download(self, self.url, output_template, info_file, archive, info_json)
+        finally:
+            ENGINE_POOL.release(engine)
+    
+    def log(self, line):
+        """Queue a log line; lines are delivered to the listener in batches"""
+        with self._output_lock:
+            self._log_buffer.append(line)
+            self.flush_log()
+    
+    def flush_log(self, force=False):
+        with self._output_lock:
+            if not self._log_buffer:
+                return
+            current_time = time.time()
+            if (force or len(self._log_buffer) >= LOG_BATCH_LINES
+                    or current_time - self._last_log_flush >= EVENT_INTERVAL):
+                self.events.log(self._log_buffer)
+                self._log_buffer = []
+                self._last_log_flush = current_time
+    
+    def set_stage(self, stage):
+        with self._output_lock:
+            if stage != self.stage:
+                self.stage = stage
+                self.flush_log(force=True)
+                self.events.stage(stage)
+    
+    def finish(self, success, message):
+        """Deliver any pending log lines, then report the final result"""
+        self.flush_log(force=True)
+        self.events.finished(success, message)
+    
+    def engine_output(self, message):
+        """Receive log output from the in-process engine"""
+        for line in str(message).splitlines():
+            self.handle_output_line(line)
+    
+    def engine_progress(self, status):
+        """Receive a progress hook dictionary from the in-process engine"""
+        if not self.is_running:
+            from yt_dlp.utils import DownloadCancelled
+            raise DownloadCancelled("Download stopped by user")
+        self.handle_progress(status)
+    
+    def handle_output_line(self, line):
+        """Route one complete line of yt-dlp output to the progress parser or the log"""
+        if not line:
+            return
+        status = parse_progress_line(line) or parse_aria2c_line(line)
+        if status is not None:
+            self.handle_progress(status)
+            return
+        if line.startswith(ARIA2C_SUMMARY_PREFIXES) and self.use_aria2c():
+            return
+        
+        self.log(line)
+        if line.endswith("has already been recorded in the archive"):
+            self.archived_skips += 1
+        if line.startswith("ERROR:"):
+            self.flush_log(force=True)
+            self.events.error(line)
+        elif line.startswith("[info] Writing"):
+            pass  # Files written next to the download, the info file even after it; nothing is extracted
+        elif line.startswith("["):
+            stage = STAGE_PREFIXES.get(line.split("]", 1)[0] + "]")
+            if stage:
+                self.set_stage(stage)
+    
+    def handle_progress(self, status):
+        """Report a progress dictionary (yt-dlp progress hook fields) as a throttled progress update"""
+        with self._output_lock:
+            self.track_fragments(status)
+            current_time = time.time()
+            if status.get("status") != "downloading" or current_time - self._last_progress_time <= EVENT_INTERVAL:
+                return
+            
+            total = status.get("total_bytes") or status.get("total_bytes_estimate")
+            downloaded = status.get("downloaded_bytes") or 0
+            if not total:
+                return
+            
+            progress = downloaded * 100.0 / total
+            line = f"[download] {progress:5.1f}% of {total / 1048576:.2f}MiB"
+            speed = status.get("speed")
+            if speed:
+                line += f" at {speed / 1048576:.2f}MiB/s"
+            eta = status.get("eta")
+            if eta is not None:
+                line += f" ETA {int(eta) // 60:02d}:{int(eta) % 60:02d}"
+            fragment_index = status.get("fragment_index")
+            if fragment_index is not None and status.get("fragment_count"):
+                line += f" (frag {int(fragment_index)}/{int(status['fragment_count'])})"
+            self.events.progress(int(progress), line, float(speed or 0.0))
+            self.record_progress(int(downloaded))
+            self._last_progress_time = current_time
+            self.flush_log()
+    
+    def add_metadata(self, file_path, video_info, cover_data=None):
+        """Write text tags and optional cover art to an audio file in a single save"""
+        try:
+            from mutagen.id3 import ID3
+            from mutagen.id3._frames import APIC, TALB, TDRC, TIT2, TPE1
+            from mutagen.mp3 import MP3
+            from mutagen.oggvorbis import OggVorbis
+            from mutagen.flac import Picture
+            
+            title = video_info.get('title', 'Unknown Title')
+            artist = video_info.get('uploader', 'Unknown Artist')
+            album = "YouTube Downloads"
+            date = video_info.get('upload_date', '')[:4]  
+            
+            ext = os.path.splitext(file_path)[1].lower()
+            
+            if ext == '.mp3':
+                audio = MP3(file_path, ID3=ID3)
+                if audio.tags is None:
+                    try:
+                        audio.add_tags()
+                    except Exception as e:
+                        self.log(f"Error adding tags: {str(e)}")
+                        return
+                
+                audio.tags.setall("TIT2", [TIT2(encoding=3, text=title)])
+                audio.tags.setall("TPE1", [TPE1(encoding=3, text=artist)])
+                audio.tags.setall("TALB", [TALB(encoding=3, text=album)])
+                if date:
+                    audio.tags.setall("TDRC", [TDRC(encoding=3, text=date)])
+                if cover_data:
+                    audio.tags.setall("APIC", [APIC(
+                        encoding=3,
+                        mime='image/jpeg',
+                        type=3, 
+                        desc='Cover',
+                        data=cover_data
+                    )])
+                audio.save()
+                
+            elif ext == '.ogg':
+                audio = OggVorbis(file_path)
+                audio["title"] = title
+                audio["artist"] = artist
+                audio["album"] = album
+                if date:
+                    audio["date"] = date
+                if cover_data:
+                    picture = Picture()
+                    picture.type = 3
+                    picture.mime = "image/jpeg"
+                    picture.desc = "Cover"
+                    picture.data = cover_data
+                    import base64
+                    audio["METADATA_BLOCK_PICTURE"] = [
+                        base64.b64encode(picture.write()).decode('ascii')
+                    ]
+                audio.save()
+                
+            self.log(f"Added metadata to: {os.path.basename(file_path)}")
+            if cover_data:
+                self.log(f"Embedded thumbnail in: {os.path.basename(file_path)}")
+        except Exception as e:
+            self.log(f"Metadata error: {str(e)}")
+    
+    def fetch_thumbnail(self, video_info):
+        """Download the video thumbnail and return it as cover-sized JPEG data"""
+        try:
+            from PIL import Image
+            
+            thumbnail_url = video_info.get('thumbnail')
+            if not thumbnail_url:
+                return None
+            
+            THUMBNAIL_CACHE.max_bytes = self.settings.get("thumbnail_cache_mb", 50) * 1024 * 1024
+            video_key = f"{video_info.get('extractor_key', '')}-{video_info.get('id', '')}"
+            if video_info.get('id'):
+                cached = THUMBNAIL_CACHE.get(video_key, THUMBNAIL_SIZE)
+                if cached is not None:
+                    return cached
+                
+            # Decode, resize and re-encode entirely in memory
+            response = get_http_session(self.settings).get(thumbnail_url, timeout=10)
+            response.raise_for_status()
+            
+            img = Image.open(io.BytesIO(response.content))
+            img.thumbnail(THUMBNAIL_SIZE)
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            
+            buffer = io.BytesIO()
+            img.save(buffer, "JPEG")
+            image_data = buffer.getvalue()
+            
+            if video_info.get('id'):
+                try:
+                    THUMBNAIL_CACHE.put(video_key, THUMBNAIL_SIZE, image_data)
+                except OSError as e:
+                    self.log(f"Thumbnail cache error: {str(e)}")
+            return image_data
+        except Exception as e:
+            self.log(f"Thumbnail error: {str(e)}")
+            return None
+    
+    def stop(self):
+        self.is_running = False
+
+HOST_ALIASES = {
+    "youtu.be": "youtube.com",
+    "x.com": "twitter.com"
+}
+
+def host_key(url):
+    """Reduce a URL to the site it is rate limited under (e.g. artist.bandcamp.com -> bandcamp.com)"""
+    hostname = (urlparse(url).hostname or "").lower().rstrip(".")
+    try:
+        # Every IP address is a server of its own, 10.0.0.1 and 127.0.0.1 share no labels
+        ipaddress.ip_address(hostname)
+        return hostname
+    except ValueError:
+        pass
+    labels = hostname.split(".")
+    if len(labels) > 2:
+        # Keep one more label for country-code second level domains such as co.uk
+        if len(labels[-1]) == 2 and labels[-2] in ("co", "com", "org", "net", "ac", "gov"):
+            labels = labels[-3:]
+        else:
+            labels = labels[-2:]
+    hostname = ".".join(labels)
+    return HOST_ALIASES.get(hostname, hostname)
+
+class HostBudget:
+    """Per-host limits on in-flight jobs and on how often a new job may start"""
+    def __init__(self):
+        self.max_in_flight = 2
+        self.min_interval = 0.0
+        self.sleep_requests = 0.0
+        self.overrides = {}
+        self.in_flight = {}
+        self.last_start = {}
+    
+    def configure(self, settings):
+        self.max_in_flight = settings.get("host_max_in_flight", 2)
+        self.overrides = settings.get("host_limits", {})
+        # Request throttling only applies with workarounds enabled, as before
+        if settings.get("enable_workarounds", True):
+            self.min_interval = settings.get("host_min_interval", 5)
+            self.sleep_requests = settings.get("host_sleep_requests", 1)
+        else:
+            self.min_interval = 0.0
+            self.sleep_requests = 0.0
+    
+    def limits(self, host):
+        override = self.overrides.get(host, {})
+        return {
+            "max_in_flight": override.get("max_in_flight", self.max_in_flight),
+            "min_interval": override.get("min_interval", self.min_interval),
+            "sleep_requests": override.get("sleep_requests", self.sleep_requests)
+        }
+    
+    def wait_time(self, host, now):
+        """Seconds until the host may start another job, or None while it is at its in-flight cap"""
+        limits = self.limits(host)
+        if self.in_flight.get(host, 0) >= max(1, limits["max_in_flight"]):
+            return None
+        last_start = self.last_start.get(host)
+        if last_start is None:
+            return 0.0
+        return max(0.0, last_start + limits["min_interval"] - now)
+    
+    def acquire(self, host, now):
+        self.in_flight[host] = self.in_flight.get(host, 0) + 1
+        self.last_start[host] = now
+    
+    def release(self, host):
+        if self.in_flight.get(host, 0) > 0:
+            self.in_flight[host] -= 1
+
+class FragmentTuner:
+    """Tries fragment concurrency levels on the first fragmented downloads of each host and keeps the fastest
+
+    A download cannot be repeated with several levels, so every candidate gets one
+    of the host's first jobs. The winner per host is cached on disk.
+    """
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path or os.path.join(app_cache_dir(), "fragment_tuning.json")
+        self.best = self._load()
+        self.trials = {}
+        self.pending = {}
+    
+    def concurrency(self, host):
+        """Fragment concurrency for the next job of a host, None while all candidates are on trial"""
+        if host in self.best:
+            return self.best[host]
+        tried = self.trials.setdefault(host, {})
+        pending = self.pending.setdefault(host, set())
+        for candidate in FRAGMENT_CANDIDATES:
+            if candidate not in tried and candidate not in pending:
+                pending.add(candidate)
+                return candidate
+        return None
+    
+    def report(self, host, concurrency, speed):
+        """Record the result of a trial, returns the host's best level once all candidates have one"""
+        if host in self.best:
+            return None
+        self.pending.get(host, set()).discard(concurrency)
+        if not speed:
+            # Nothing was fragmented or the job failed, the candidate goes to a later job
+            return None
+        tried = self.trials.setdefault(host, {})
+        tried[concurrency] = speed
+        if len(tried) < len(FRAGMENT_CANDIDATES):
+            return None
+        self.best[host] = max(tried, key=tried.get)
+        self._save()
+        return self.best[host]
+    
+    def _load(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            temp_path = f"{self.cache_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.best, f)
+            os.replace(temp_path, self.cache_path)
+        except OSError:
+            pass  # Tuning starts over next time
+
+class DownloadJob:
+    """A queued download together with its latest reported state"""
+    def __init__(self, job_id, url, options, ffmpeg_dir, settings):
+        self.job_id = job_id
+        self.url = url
+        self.host = host_key(url)
+        self.key = job_key(url, options)
+        self.options = options
+        self.ffmpeg_dir = ffmpeg_dir
+        self.settings = settings
+        self.status = "Queued"
+        self.stage = ""
+        self.error = ""
+        self.progress = 0
+        self.speed = 0.0
+        self.message = ""
+        self.cancelled = False
+        self.parent = None
+        self.children = []
+        self.expanding = False
+        self.listing_complete = False
+        # Set while a playlist entry holds one of the listing's buffer slots
+        self.holds_entry_slot = False
+        self.fragment_trial = None
+        self.thread = None
+
+def update_playlist_job(job):
+    """Derive an expanded playlist's progress and state from its entries, returns True once all are done"""
+    finished = [child for child in job.children if child.status in ("Completed", "Failed", "Stopped")]
+    completed = sum(1 for child in finished if child.status == "Completed")
+    # Every entry listed so far may already be queued by another job, leaving none of its own
+    job.progress = int(sum(child.progress for child in job.children) / len(job.children)) if job.children else 0
+    job.speed = sum(child.speed for child in job.children if child.status == "Downloading")
+    if job.expanding or len(finished) < len(job.children):
+        job.status = "Downloading"
+        job.stage = f"{len(finished)} of {len(job.children)} entries done" + (", listing" if job.expanding else "")
+        return False
+    
+    job.stage = ""
+    if job.cancelled:
+        job.status = "Stopped"
+        job.message = f"Playlist cancelled: {completed} of {len(job.children)} entries downloaded"
+        return True
+    job.status = "Completed" if completed == len(job.children) and job.listing_complete else "Failed"
+    job.message = f"Playlist finished: {completed} of {len(job.children)} entries downloaded"
+    if not job.listing_complete:
+        job.message += " (the playlist could not be listed completely)"
+    return True
+
+class JobQueue:
+    """Queue policy shared by the GUI scheduler and the headless runner
+    
+    Starts the oldest queued job of every host within the global and per-host
+    limits, keeps the journal, queues playlist entries as they are listed and
+    books finished jobs. Subclasses run the workers and report changes; callers
+    serialize access.
+    
+    Subclasses must define _launch(job, options), which starts a worker running
+    a DownloadTask for the job with the given options, and _task(job), which
+    returns the DownloadTask of a running or listing job or None. _notify and
+    _wake are optional. They are not abstract methods, because the GUI scheduler
+    also derives from QObject, whose metaclass cannot be combined with ABCMeta.
+    """
+    def __init__(self, max_workers=3, journal=None):
+        self.max_workers = max_workers
+        self.journal = journal
+        self.jobs = []
+        self.queue = []
+        self.running = []
+        # Playlists that are still being listed, they hold no worker or host slot
+        self.expanding = []
+        self.budget = HostBudget()
+        self.tuner = FragmentTuner()
+        self._next_id = 1
+    
+    def _notify(self, job, event, value=None):
+        """Report a change: queued, updated, progress, stage, log or finished"""
+        pass
+    
+    def _wake(self):
+        """Ask for another pass over the queue once the current event is handled"""
+        pass
+    
+    def active_job(self, key):
+        """The queued, running or listing job with the given key, or None"""
+        for job in self.queue + self.running + self.expanding:
+            if job.key == key:
+                return job
+        return None
+    
+    def queue_job(self, url, options, ffmpeg_dir, settings, parent=None):
+        """Queue a download, returns the job; a download already queued or running is not queued twice
+        as both jobs would share one staging directory"""
+        existing = self.active_job(job_key(url, options))
+        if existing is not None:
+            return existing
+        job = DownloadJob(self._next_id, url, options, ffmpeg_dir, settings)
+        self._next_id += 1
+        job.parent = parent
+        if parent is not None:
+            parent.children.append(job)
+            job.holds_entry_slot = True
+        self.jobs.append(job)
+        self.queue.append(job)
+        self._journal_state(job)
+        self._notify(job, "queued", url)
+        self._wake()
+        return job
+    
+    def retry(self, job):
+        """Requeue a failed or stopped job without touching the rest of the queue"""
+        if job.children:
+            # Retrying an expanded playlist retries the entries that did not finish
+            job.cancelled = False
+            retried = [self.retry(child) for child in job.children if child.status in ("Failed", "Stopped")]
+            update_playlist_job(job)
+            self._notify(job, "updated")
+            return any(retried)
+        if job.status not in ("Failed", "Stopped"):
+            return False
+        job.status = "Queued"
+        job.progress = 0
+        job.speed = 0.0
+        job.message = ""
+        job.error = ""
+        job.cancelled = False
+        self.queue.append(job)
+        self._journal_state(job)
+        self._notify(job, "updated")
+        self._wake()
+        return True
+    
+    def stop_all(self):
+        for job in self.queue:
+            job.status = "Stopped"
+            job.message = "Download stopped by user"
+            self._journal_state(job)
+            self._entry_dequeued(job)
+            self._notify(job, "updated")
+        self.queue.clear()
+        for job in self.running + self.expanding:
+            self._task(job).stop()
+        self._wake()
+    
+    def cancel(self, job):
+        """Stop a queued or running job for good, returns False once it has finished"""
+        if job.children or job in self.expanding:
+            # An expanded playlist is cancelled through its remaining entries
+            listing = job in self.expanding
+            if listing:
+                job.cancelled = True
+                self._task(job).stop()
+            return any([self.cancel(child) for child in list(job.children)]) or listing
+        if job in self.queue:
+            self.queue.remove(job)
+            self._entry_dequeued(job)
+            job.cancelled = True
+            job.status = "Stopped"
+            self._journal_state(job)
+            self._notify(job, "finished", "Cancelled")
+            self._wake()
+            return True
+        if job in self.running:
+            job.cancelled = True
+            self._task(job).stop()
+            return True
+        return False
+    
+    def clear(self):
+        """Forget finished jobs, only allowed while nothing is running or queued"""
+        if self.running or self.queue or self.expanding:
+            return False
+        # Job ids keep counting so ids handed out through the API are never reused
+        self.jobs = []
+        return True
+    
+    def active_count(self):
+        return len(self.running) + len(self.expanding)
+    
+    def throughput(self):
+        return sum(job.speed for job in self.running)
+    
+    def leaf_jobs(self):
+        """Jobs that download something, expanded playlists are represented by their entries"""
+        return [job for job in self.jobs if not job.children]
+    
+    def overall_progress(self):
+        jobs = self.leaf_jobs()
+        if not jobs:
+            return 0
+        return int(sum(job.progress for job in jobs) / len(jobs))
+    
+    def fill(self):
+        """Start whatever the limits allow, returns seconds until a waiting host may start, or None"""
+        now = time.monotonic()
+        next_wake = None
+        
+        # Start the oldest queued job of every host that still has budget left
+        for job in list(self.queue):
+            if len(self.running) >= max(1, self.max_workers):
+                break
+            wait = self.budget.wait_time(job.host, now)
+            if wait is None:
+                continue
+            if wait > 0:
+                next_wake = wait if next_wake is None else min(next_wake, wait)
+                continue
+            self.queue.remove(job)
+            self._entry_dequeued(job)
+            self.budget.acquire(job.host, now)
+            self._start_job(job)
+        return next_wake
+    
+    def _start_job(self, job):
+        options = dict(job.options, sleep_requests=self.budget.limits(job.host)["sleep_requests"])
+        if job.settings.get("fragment_autotune", False):
+            job.fragment_trial = self.tuner.concurrency(job.host)
+            if job.fragment_trial:
+                options["concurrent_fragments"] = job.fragment_trial
+        
+        job.status = "Downloading"
+        self.running.append(job)
+        self._journal_state(job)
+        self._notify(job, "updated")
+        self._launch(job, options)
+    
+    def job_progress(self, job, value, line, speed):
+        job.progress = value
+        job.speed = speed
+        job.message = line
+        self._notify(job, "progress", line)
+        if job.parent is not None:
+            update_playlist_job(job.parent)
+            self._notify(job.parent, "updated")
+    
+    def job_stage(self, job, stage):
+        job.stage = stage
+        if stage != "Downloading":
+            job.speed = 0.0
+        self._notify(job, "stage", stage)
+    
+    def job_error(self, job, message):
+        job.error = message
+        job.message = message
+        self._notify(job, "updated")
+    
+    def add_entries(self, job, entries):
+        """Queue the entries of a playlist as jobs of their own while it is being listed"""
+        if job in self.running:
+            # Listing only fetches a page now and then, let the entries have the slots
+            self.running.remove(job)
+            self.budget.release(job.host)
+            self.expanding.append(job)
+            job.expanding = True
+        if job.cancelled:
+            return
+        options = dict(job.options, is_playlist=False)
+        for entry in entries:
+            if self.active_job(job_key(entry["url"], options)) is not None:
+                # Listed twice or already queued on its own, its buffer slot is free again right away
+                self._task(job).release_entry()
+                continue
+            self.queue_job(entry["url"], options, job.ffmpeg_dir, job.settings, parent=job)
+        update_playlist_job(job)
+        self._notify(job, "updated")
+    
+    def _entry_dequeued(self, job):
+        """Let the listing of a job's playlist continue once the job first left the queue"""
+        if not job.holds_entry_slot:
+            return
+        job.holds_entry_slot = False
+        if job.parent in self.expanding:
+            self._task(job.parent).release_entry()
+    
+    def job_finished(self, job, task, success, message):
+        """Book a job whose task has returned"""
+        if job in self.running:
+            self.running.remove(job)
+            self.budget.release(job.host)
+        elif job in self.expanding:
+            self.expanding.remove(job)
+            job.expanding = False
+        else:
+            return
+        
+        job.speed = 0.0
+        job.stage = ""
+        job.message = message if success or not job.error else job.error
+        if success:
+            job.status = "Completed"
+            job.progress = 100
+        elif task.is_running:
+            job.status = "Failed"
+        else:
+            job.status = "Stopped"
+        self._journal_state(job)
+        
+        if job.fragment_trial:
+            tuned = self.tuner.report(job.host, job.fragment_trial, task.fragment_speed() if success else 0.0)
+            job.fragment_trial = None
+            if tuned:
+                self._notify(job, "log", [f"Auto-tune: {job.host} downloads fastest with {tuned} concurrent fragments"])
+        
+        if job.children:
+            job.listing_complete = success
+        playlist = job if job.children else job.parent
+        playlist_done = playlist is not None and update_playlist_job(playlist)
+        self._notify(job, "finished", message)
+        if playlist is not None and playlist is not job:
+            self._notify(playlist, "finished" if playlist_done else "updated", playlist.message)
+        self._wake()
+    
+    def _journal_state(self, job):
+        if self.journal is None:
+            return
+        # Cancelled jobs are not offered for resuming
+        if job.status == "Completed" or job.cancelled:
+            self.journal.remove(job.key)
+        else:
+            self.journal.update(
+                job.key,
+                url=job.url,
+                options=job.options,
+                ffmpeg_dir=job.ffmpeg_dir,
+                state=job.status,
+                parent=job.parent.key if job.parent is not None else None
+            )
+
+class _RunnerEvents(TaskEvents):
+    """Feeds the events of a job's task into the runner"""
+    def __init__(self, runner, job):
+        self.runner = runner
+        self.job = job
+        self.result = (False, "Download ended without a result")
+    
+    def progress(self, value, line, speed):
+        with self.runner._cond:
+            self.runner.job_progress(self.job, value, line, speed)
+    
+    def stage(self, stage):
+        with self.runner._cond:
+            self.runner.job_stage(self.job, stage)
+    
+    def file(self, path):
+        self.runner.listener(self.job, "file", path)
+    
+    def entries(self, entries):
+        with self.runner._cond:
+            self.runner.add_entries(self.job, entries)
+    
+    def error(self, message):
+        with self.runner._cond:
+            self.runner.job_error(self.job, message)
+    
+    def log(self, lines):
+        self.runner.listener(self.job, "log", lines)
+    
+    def finished(self, success, message):
+        self.result = (success, message)
+
+class DownloadRunner(JobQueue):
+    """Runs download jobs on plain threads with the same global and per-host limits as the GUI scheduler
+
+    The listener is called as listener(job, event, value) from worker threads.
+    """
+    def __init__(self, settings, journal=None, listener=None):
+        super().__init__(settings.get("max_concurrent_downloads", 3), journal)
+        self.settings = settings
+        self.listener = listener or (lambda job, event, value: None)
+        self.budget.configure(settings)
+        self._tasks = {}
+        self._closed = False
+        self._cond = threading.Condition()
+        self._dispatcher = threading.Thread(target=self._dispatch, name="download-runner", daemon=True)
+        self._dispatcher.start()
+    
+    def add_job(self, url, options, ffmpeg_dir=""):
+        with self._cond:
+            return self.queue_job(url, options, ffmpeg_dir, self.settings)
+    
+    def stop_all(self):
+        with self._cond:
+            super().stop_all()
+    
+    def cancel(self, job):
+        with self._cond:
+            return super().cancel(job)
+    
+    def close(self):
+        """Stop everything and let the dispatcher exit"""
+        with self._cond:
+            self.stop_all()
+            self._closed = True
+            self._cond.notify_all()
+    
+    def wait_idle(self, timeout=None):
+        """Block until no job is queued or running, returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self.queue or self.running or self.expanding:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+    
+    def _launch(self, job, options):
+        task = DownloadTask(job.url, options, job.ffmpeg_dir, job.settings, self.journal, job.key,
+                            events=_RunnerEvents(self, job))
+        self._tasks[job.job_id] = task
+        threading.Thread(target=self._run_job, args=(job, task), name=f"download-{job.job_id}", daemon=True).start()
+    
+    def _task(self, job):
+        return self._tasks.get(job.job_id)
+    
+    def _notify(self, job, event, value=None):
+        self.listener(job, event, value)
+    
+    def _wake(self):
+        self._cond.notify_all()
+    
+    def _dispatch(self):
+        with self._cond:
+            while not self._closed:
+                self._cond.wait(self.fill())
+    
+    def _run_job(self, job, task):
+        try:
+            task.run()
+        finally:
+            success, message = task.events.result
+            with self._cond:
+                self.job_finished(job, task, success, message)
+                self._tasks.pop(job.job_id, None)
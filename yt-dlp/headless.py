@@ -0,0 +1,264 @@
+"""Headless front end for the download pipeline, no display server or Qt needed
+
+    python headless.py URL [URL ...]
+    python headless.py -i urls.txt -o ~/Downloads -f "Audio Only (MP3)"
+    cat urls.txt | python headless.py -i - -o ~/Downloads
+    python headless.py --daemon -i queue.txt -o /srv/downloads
+    python headless.py --daemon --api -o /srv/downloads
+    python headless.py --probe URL
+
+Settings are read from the same settings.json as the GUI. In daemon mode the
+input file is followed for new lines (like tail -f) and unfinished jobs from
+the journal are resumed on startup, so the process can be restarted at any time.
+With --api (or api_enabled in the settings) the daemon also accepts jobs through
+the local HTTP API described in job_api.py. --probe lists the formats of each
+URL instead of downloading; a download of the same URL shortly afterwards
+reuses the probed metadata instead of extracting it again.
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+from logging.handlers import RotatingFileHandler
+
+from downloader_core import DownloadRunner, DownloadTask, JobJournal, TaskEvents
+
+FORMATS = [
+    "Best Quality", "1080p", "720p", "480p", "360p",
+    "Audio Only (MP3)", "Audio Only (OGG)"
+]
+FOLLOW_INTERVAL = 1.0
+
+def load_settings(path):
+    try:
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                return json.load(f)
+    except (OSError, ValueError):
+        pass
+    return {}
+
+def configure_logging(settings):
+    """Log to stdout and, like the GUI, to a size-rotated file"""
+    logger = logging.getLogger("yt-dlp-gui")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(console)
+    
+    log_file = settings.get("log_file", "download.log")
+    if log_file:
+        try:
+            handler = RotatingFileHandler(
+                log_file,
+                maxBytes=settings.get("log_file_mb", 5) * 1024 * 1024,
+                backupCount=3,
+                encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            logger.addHandler(handler)
+        except OSError as e:
+            logger.warning(f"Could not open log file: {str(e)}")
+    return logger
+
+def read_urls(stream):
+    for line in stream:
+        url = line.strip()
+        if url and not url.startswith("#"):
+            yield url
+
+def follow_urls(path, stop):
+    """Yield URLs appended to a file after it was opened, until stop is set"""
+    open(path, "a").close()
+    with open(path, "r", encoding="utf-8") as f:
+        f.seek(0, os.SEEK_END)
+        partial = ""
+        while not stop.is_set():
+            chunk = f.readline()
+            if not chunk:
+                stop.wait(FOLLOW_INTERVAL)
+                continue
+            partial += chunk
+            if not partial.endswith("\n"):
+                continue
+            url, partial = partial.strip(), ""
+            if url and not url.startswith("#"):
+                yield url
+
+class ConsoleListener:
+    """Prints job events, progress at most once per ten percent"""
+    def __init__(self, logger):
+        self.logger = logger
+        self._progress_step = {}
+    
+    def __call__(self, job, event, value):
+        prefix = f"[{job.job_id}] "
+        if event == "log":
+            for line in value:
+                self.logger.info(prefix + line)
+        elif event == "progress":
+            step = job.progress // 10
+            if step > self._progress_step.get(job.job_id, -1):
+                self._progress_step[job.job_id] = step
+                self.logger.info(prefix + value)
+        elif event == "queued":
+            self.logger.info(f"{prefix}Queued: {value}")
+        elif event == "finished":
+            self._progress_step.pop(job.job_id, None)
+            self.logger.info(f"{prefix}{job.status}: {job.message}")
+
+class ProbeEvents(TaskEvents):
+    """Prints the log of a probe task"""
+    def __init__(self, logger):
+        self.logger = logger
+    
+    def log(self, lines):
+        for line in lines:
+            self.logger.info(line)
+
+def probe_urls(urls, options, settings, ffmpeg_dir, logger):
+    """List the formats of each URL, returns the exit code"""
+    failed = 0
+    for url in urls:
+        task = DownloadTask(url, options, ffmpeg_dir, settings, events=ProbeEvents(logger))
+        if task.probe() is None:
+            logger.info(f"Could not probe {url}")
+            failed += 1
+    return 1 if failed else 0
+
+def build_options(args, settings):
+    return {
+        "format": args.format,
+        "container": args.container,
+        "audio_quality": args.audio_quality,
+        "output_path": os.path.abspath(args.output or settings.get("download_path", "") or os.getcwd()),
+        "is_playlist": args.playlist,
+        "write_thumbnail": args.write_thumbnail,
+        "write_description": args.write_description
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Download videos with the yt-dlp GUI pipeline, without a GUI")
+    parser.add_argument("urls", nargs="*", help="URLs to download")
+    parser.add_argument("-i", "--input", help="file with one URL per line, - for stdin")
+    parser.add_argument("-o", "--output", help="output directory (default: download_path from the settings)")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="Best Quality")
+    parser.add_argument("--container", default="MP4", help="MP4, MKV, WEBM or Original")
+    parser.add_argument("--audio-quality", default="192KBPS", help="192KBPS, 256KBPS, 320KBPS or Best")
+    parser.add_argument("--playlist", action="store_true", help="download whole playlists")
+    parser.add_argument("--write-thumbnail", action="store_true")
+    parser.add_argument("--write-description", action="store_true")
+    parser.add_argument("-j", "--jobs", type=int, help="concurrent downloads (default: from the settings)")
+    parser.add_argument("--settings", default="settings.json", help="settings file shared with the GUI")
+    parser.add_argument("--journal", default="download_journal.json", help="journal of unfinished jobs")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running, following the input for new URLs and resuming unfinished jobs")
+    parser.add_argument("--api", action="store_true", help="in daemon mode, accept jobs through the local HTTP API")
+    parser.add_argument("--api-port", type=int, help="port of the HTTP API (default: api_port from the settings)")
+    parser.add_argument("--probe", action="store_true",
+                        help="list the formats of the URLs instead of downloading and keep them for a later download")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    settings = load_settings(args.settings)
+    if args.jobs:
+        settings["max_concurrent_downloads"] = args.jobs
+    logger = configure_logging(settings)
+    
+    options = build_options(args, settings)
+    os.makedirs(options["output_path"], exist_ok=True)
+    ffmpeg_dir = settings.get("ffmpeg_path", "")
+    
+    if args.probe:
+        urls = list(args.urls)
+        if args.input == "-":
+            urls += read_urls(sys.stdin)
+        elif args.input:
+            with open(args.input, "r", encoding="utf-8") as f:
+                urls += read_urls(f)
+        if not urls:
+            logger.info("No URLs given")
+            return 2
+        return probe_urls(urls, options, settings, ffmpeg_dir, logger)
+    
+    journal = JobJournal(args.journal)
+    unfinished = journal.unfinished() if args.daemon else []
+    runner = DownloadRunner(settings, journal, ConsoleListener(logger))
+    
+    stop = threading.Event()
+    def request_stop(signum, frame):
+        logger.info("Stopping downloads...")
+        stop.set()
+    signal.signal(signal.SIGINT, request_stop)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, request_stop)
+    
+    for entry in unfinished:
+        runner.add_job(entry["url"], entry.get("options", {}), entry.get("ffmpeg_dir", ""))
+    for url in args.urls:
+        runner.add_job(url, options, ffmpeg_dir)
+    
+    def feed():
+        if args.input == "-":
+            urls = read_urls(sys.stdin)
+        elif args.input and args.daemon:
+            urls = follow_urls(args.input, stop)
+        elif args.input:
+            with open(args.input, "r", encoding="utf-8") as f:
+                urls = list(read_urls(f))
+        else:
+            return
+        for url in urls:
+            if stop.is_set():
+                return
+            runner.add_job(url, options, ffmpeg_dir)
+    
+    feeder = threading.Thread(target=feed, name="url-feeder", daemon=True)
+    feeder.start()
+    
+    api_server = None
+    if args.daemon and (args.api or settings.get("api_enabled", False)):
+        from job_api import JobApiServer, RunnerBackend
+        api_server = JobApiServer(
+            RunnerBackend(runner, options, ffmpeg_dir),
+            port=args.api_port or settings.get("api_port", 8787),
+            token=settings.get("api_token", ""),
+            max_queued=settings.get("api_max_queued", 1000)
+        ).start()
+        logger.info(f"Job API listening on http://127.0.0.1:{api_server.port}/jobs")
+    
+    if args.daemon:
+        logger.info("Daemon running, waiting for URLs")
+        while not stop.is_set():
+            stop.wait(FOLLOW_INTERVAL)
+    else:
+        # Wait for the input to be read completely, then for the queue to drain
+        while feeder.is_alive() and not stop.is_set():
+            feeder.join(FOLLOW_INTERVAL)
+        while not stop.is_set() and not runner.wait_idle(FOLLOW_INTERVAL):
+            pass
+    
+    if api_server is not None:
+        api_server.stop()
+    runner.close()
+    runner.wait_idle(10)
+    journal.flush()
+    
+    if not runner.jobs and not args.daemon:
+        logger.info("No URLs given")
+        return 2
+    # Expanded playlists are counted through their entries
+    jobs = [job for job in runner.jobs if not job.children]
+    failed = [job for job in jobs if job.status != "Completed"]
+    logger.info(f"Finished: {len(jobs) - len(failed)} succeeded, {len(failed)} failed")
+    # Jobs a daemon stops on shutdown are resumed by the next start
+    return 1 if failed and not args.daemon else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""Local HTTP/JSON API for submitting, watching and cancelling download jobs
+
+    POST   /jobs              {"url": "..."} or {"urls": [...]}, optional "options"
+    GET    /jobs              all jobs of this session
+    GET    /jobs/<id>         status and progress of one job
+    DELETE /jobs/<id>         cancel a queued or running job
+    POST   /jobs/<id>/cancel  same as DELETE
+
+Submissions are refused with 429 and a Retry-After header while the queue
+holds api_max_queued jobs. The server only listens on localhost; with
+api_token set, requests need an "Authorization: Bearer <token>" header.
+
+Web pages must not be able to drive the API from the user's browser, so
+requests with an Origin header or a Host other than localhost are refused,
+and POST requests need "Content-Type: application/json", which browsers do
+not send cross-origin without a preflight the server never answers.
+"""
+import hmac
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+API_PORT = 8787
+API_MAX_QUEUED = 1000
+API_MAX_BODY = 16 * 1024 * 1024
+RETRY_AFTER = 5
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+# Options a client may set with their types, the same dict start_download builds from the UI
+JOB_OPTION_TYPES = {
+    "format": str,
+    "container": str,
+    "audio_quality": str,
+    "output_path": str,
+    "is_playlist": bool,
+    "write_thumbnail": bool,
+    "write_description": bool
+}
+
+def job_status(job):
+    return {
+        "id": job.job_id,
+        "url": job.url,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": job.progress,
+        "speed": job.speed,
+        "message": job.message,
+        "error": job.error,
+        "playlist": job.parent.job_id if job.parent is not None else None,
+        "entries": [child.job_id for child in job.children]
+    }
+
+class ApiError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+class RunnerBackend:
+    """Connects the API to a headless DownloadRunner"""
+    def __init__(self, runner, default_options, ffmpeg_dir=""):
+        self.runner = runner
+        self.default_options = default_options
+        self.ffmpeg_dir = ffmpeg_dir
+    
+    def queued_count(self):
+        return len(self.runner.queue)
+    
+    def submit(self, urls, options):
+        return [self.runner.add_job(url, dict(self.default_options, **options), self.ffmpeg_dir) for url in urls]
+    
+    def jobs(self):
+        return list(self.runner.jobs)
+    
+    def cancel(self, job):
+        return self.runner.cancel(job)
+
+class JobApiServer:
+    """Serves the job API on a background thread for a backend (RunnerBackend or the GUI's)"""
+    def __init__(self, backend, port=API_PORT, token="", max_queued=API_MAX_QUEUED, host="127.0.0.1"):
+        self.backend = backend
+        self.token = token
+        self.max_queued = max_queued
+        self._submit_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+    
+    @property
+    def port(self):
+        return self._server.server_address[1]
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="job-api", daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def find(self, job_id):
+        for job in self.backend.jobs():
+            if str(job.job_id) == job_id:
+                return job
+        raise ApiError(404, f"No job {job_id}")
+    
+    def submit(self, payload):
+        if not isinstance(payload, dict):
+            raise ApiError(400, "Expected a JSON object")
+        urls = payload.get("urls", [payload["url"]] if "url" in payload else [])
+        if not isinstance(urls, list) or not urls or not all(isinstance(url, str) and url.strip() for url in urls):
+            raise ApiError(400, "Expected \"url\" or a non-empty \"urls\" list")
+        options = payload.get("options", {})
+        if not isinstance(options, dict):
+            raise ApiError(400, "\"options\" must be an object")
+        unknown = set(options) - set(JOB_OPTION_TYPES)
+        if unknown:
+            raise ApiError(400, f"Unknown options: {', '.join(sorted(unknown))}")
+        for key, value in options.items():
+            if not isinstance(value, JOB_OPTION_TYPES[key]):
+                raise ApiError(400, f"Option {key} must be {'true or false' if JOB_OPTION_TYPES[key] is bool else 'a string'}")
+        
+        # Check and enqueue atomically so concurrent clients cannot overshoot the limit
+        with self._submit_lock:
+            queued = self.backend.queued_count()
+            if queued + len(urls) > self.max_queued:
+                raise ApiError(429, f"Queue full ({queued} of {self.max_queued} queued)",
+                               {"Retry-After": str(RETRY_AFTER)})
+            jobs = self.backend.submit([url.strip() for url in urls], options)
+        return {"jobs": [job_status(job) for job in jobs]}
+    
+    def _handler_class(self):
+        api = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def log_message(self, format, *args):
+                pass  # Requests are not worth a log line each
+            
+            def do_GET(self):
+                self._dispatch("GET")
+            
+            def do_POST(self):
+                self._dispatch("POST")
+            
+            def do_DELETE(self):
+                self._dispatch("DELETE")
+            
+            def _dispatch(self, method):
+                try:
+                    self._check_origin(method)
+                    self._check_token()
+                    status, body = self._route(method, self.path.split("?", 1)[0].strip("/").split("/"))
+                    self._reply(status, body)
+                except ApiError as e:
+                    # A request body may be left unread after an error, do not reuse the connection
+                    self.close_connection = True
+                    self._reply(e.status, {"error": str(e)}, e.headers)
+                except Exception as e:
+                    self.close_connection = True
+                    self._reply(500, {"error": str(e)})
+            
+            def _check_origin(self, method):
+                if "Origin" in self.headers:
+                    raise ApiError(403, "Requests from web pages are not accepted")
+                # Guards against DNS rebinding, where a web page's own host name resolves to 127.0.0.1
+                host = self.headers.get("Host", "")
+                host = host[1:host.find("]")] if host.startswith("[") else host.rsplit(":", 1)[0]
+                if host.lower() not in LOCAL_HOSTS:
+                    raise ApiError(403, "Host must be localhost")
+                if method == "POST" and self.headers.get_content_type() != "application/json":
+                    raise ApiError(415, "Content-Type must be application/json")
+            
+            def _check_token(self):
+                if not api.token:
+                    return
+                supplied = self.headers.get("Authorization", "")
+                if not hmac.compare_digest(supplied, f"Bearer {api.token}"):
+                    raise ApiError(401, "Missing or wrong API token")
+            
+            def _route(self, method, parts):
+                if parts[0] != "jobs" or len(parts) > 3:
+                    raise ApiError(404, "Not found")
+                
+                if len(parts) == 1:
+                    if method == "GET":
+                        jobs = api.backend.jobs()
+                        return 200, {
+                            "jobs": [job_status(job) for job in jobs],
+                            "queued": api.backend.queued_count()
+                        }
+                    if method == "POST":
+                        return 202, api.submit(self._read_json())
+                    raise ApiError(405, "Method not allowed")
+                
+                job = api.find(parts[1])
+                if len(parts) == 2 and method == "GET":
+                    return 200, job_status(job)
+                if (len(parts) == 2 and method == "DELETE") or (parts[2:] == ["cancel"] and method == "POST"):
+                    if not api.backend.cancel(job):
+                        raise ApiError(409, f"Job {job.job_id} is already {job.status.lower()}")
+                    return 200, job_status(job)
+                raise ApiError(405, "Method not allowed")
+            
+            def _read_json(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length > API_MAX_BODY:
+                    raise ApiError(413, "Request body too large")
+                try:
+                    return json.loads(self.rfile.read(length) or b"null")
+                except ValueError:
+                    raise ApiError(400, "Invalid JSON")
+            
+            def _reply(self, status, body, headers=None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+        
+        return Handler
@@ -1,39 +1,44 @@
 import os
 import sys
-import subprocess
 import json
-import re
+import logging
 import shutil
 import time
-import tempfile
-import requests
-import base64
-import platform
-from pathlib import Path
+import threading
+from logging.handlers import RotatingFileHandler
 from typing import Optional
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel,
-    QLineEdit, QPushButton, QComboBox, QProgressBar, QTextEdit, QFileDialog,
-    QMessageBox, QGroupBox, QCheckBox, QMenuBar, QMenu, QDialog, QFormLayout
+    QLineEdit, QPushButton, QComboBox, QProgressBar, QTextEdit, QPlainTextEdit, QFileDialog,
+    QMessageBox, QGroupBox, QCheckBox, QMenuBar, QMenu, QDialog, QFormLayout,
+    QSpinBox, QTabWidget, QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QScrollArea, QFrame
 )
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
-from PyQt6.QtGui import QIcon, QAction, QTextCursor, QFont, QCloseEvent
+from PyQt6.QtCore import Qt, QObject, QRegularExpression, QThread, QTimer, pyqtSignal
+from PyQt6.QtGui import QIcon, QAction, QTextCursor, QFont, QCloseEvent, QRegularExpressionValidator
 
-from mutagen.easyid3 import EasyID3
-from mutagen.id3 import ID3
-from mutagen.id3._frames import APIC
-from mutagen.mp3 import MP3
-from mutagen.oggvorbis import OggVorbis
-from mutagen.flac import FLAC, Picture
-from PIL import Image
+# The download pipeline itself is Qt-free and shared with the headless CLI
+from downloader_core import (
+    ARCHIVE_FILE, ARIA2C_SEGMENTS, ENGINE_POOL, FRAGMENT_DEFAULTS, INFO_CACHE_MINUTES, SIZE_PATTERN, STAGING_DIR_NAME,
+    YTDLP_UPDATED, DependencyCheck, DownloadTask, JobJournal, JobQueue, TaskEvents, reset_http_session, update_ytdlp
+)
 
 class SettingsDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Settings")
-        self.setFixedSize(500, 550)
+        self.resize(500, 600)
         
         layout = QVBoxLayout()
+        tabs = QTabWidget()
+        
+        general_tab = QWidget()
+        general_layout = QVBoxLayout(general_tab)
+        downloads_tab = QWidget()
+        downloads_layout = QVBoxLayout(downloads_tab)
+        engine_tab = QWidget()
+        engine_tab_layout = QVBoxLayout(engine_tab)
+        automation_tab = QWidget()
+        automation_layout = QVBoxLayout(automation_tab)
         
         # Download path section
         path_group = QGroupBox("Paths")
@@ -64,7 +69,7 @@ class SettingsDialog(QDialog):
         path_layout.addWidget(self.ffmpeg_label)
         path_layout.addLayout(ffmpeg_row)
         path_group.setLayout(path_layout)
-        layout.addWidget(path_group)
+        general_layout.addWidget(path_group)
         
         # Format options
         format_group = QGroupBox("Format Options")
@@ -97,7 +102,7 @@ class SettingsDialog(QDialog):
         format_layout.addWidget(self.audio_quality_label)
         format_layout.addWidget(self.audio_quality_combo)
         format_group.setLayout(format_layout)
-        layout.addWidget(format_group)
+        general_layout.addWidget(format_group)
         
         # Metadata options
         metadata_group = QGroupBox("Metadata")
@@ -107,11 +112,17 @@ class SettingsDialog(QDialog):
         self.metadata_check = QCheckBox("Add metadata to audio files")
         self.thumbnail_check = QCheckBox("Embed thumbnails in audio files")
         
+        self.thumbnail_cache_label = QLabel("Thumbnail Cache Size (MB, 0 disables):")
+        self.thumbnail_cache_spin = QSpinBox()
+        self.thumbnail_cache_spin.setRange(0, 2048)
+        
         metadata_layout.addWidget(self.metadata_label)
         metadata_layout.addWidget(self.metadata_check)
         metadata_layout.addWidget(self.thumbnail_check)
+        metadata_layout.addWidget(self.thumbnail_cache_label)
+        metadata_layout.addWidget(self.thumbnail_cache_spin)
         metadata_group.setLayout(metadata_layout)
-        layout.addWidget(metadata_group)
+        general_layout.addWidget(metadata_group)
         
         # Verbosity options
         verbosity_group = QGroupBox("Verbosity")
@@ -130,13 +141,191 @@ class SettingsDialog(QDialog):
         self.ignore_errors_check = QCheckBox("Ignore download errors")
         self.workarounds_check = QCheckBox("Enable workarounds for problematic sites")
         
+        self.log_lines_label = QLabel("Console Line Limit:")
+        self.log_lines_spin = QSpinBox()
+        self.log_lines_spin.setRange(100, 1000000)
+        self.log_lines_spin.setSingleStep(1000)
+        
+        self.log_file_label = QLabel("Log File (rotated, empty disables):")
+        self.log_file_edit = QLineEdit()
+        
         verbosity_layout.addWidget(self.verbosity_label)
         verbosity_layout.addWidget(self.verbosity_combo)
+        verbosity_layout.addWidget(self.log_lines_label)
+        verbosity_layout.addWidget(self.log_lines_spin)
+        verbosity_layout.addWidget(self.log_file_label)
+        verbosity_layout.addWidget(self.log_file_edit)
         verbosity_layout.addWidget(self.simulate_check)
         verbosity_layout.addWidget(self.ignore_errors_check)
         verbosity_layout.addWidget(self.workarounds_check)
         verbosity_group.setLayout(verbosity_layout)
-        layout.addWidget(verbosity_group)
+        downloads_layout.addWidget(verbosity_group)
+        
+        # Engine options
+        engine_group = QGroupBox("Engine")
+        engine_layout = QVBoxLayout()
+        
+        self.engine_label = QLabel("Download Engine:")
+        self.engine_combo = QComboBox()
+        self.engine_combo.addItems([
+            "In-process",
+            "Subprocess"
+        ])
+        
+        self.stage_check = QCheckBox("Download directly into the output folder (no extra copy)")
+        self.resume_check = QCheckBox("Keep partial downloads and resume them after a restart")
+        self.expand_check = QCheckBox("Split playlists into one download per entry")
+        
+        self.concurrency_label = QLabel("Concurrent Downloads:")
+        self.concurrency_spin = QSpinBox()
+        self.concurrency_spin.setRange(1, 16)
+        
+        self.host_concurrency_label = QLabel("Concurrent Downloads per Site:")
+        self.host_concurrency_spin = QSpinBox()
+        self.host_concurrency_spin.setRange(1, 16)
+        
+        self.host_interval_label = QLabel("Seconds between Downloads from the same Site (workarounds):")
+        self.host_interval_spin = QSpinBox()
+        self.host_interval_spin.setRange(0, 300)
+        
+        engine_layout.addWidget(self.engine_label)
+        engine_layout.addWidget(self.engine_combo)
+        engine_layout.addWidget(self.stage_check)
+        engine_layout.addWidget(self.resume_check)
+        engine_layout.addWidget(self.expand_check)
+        engine_layout.addWidget(self.concurrency_label)
+        engine_layout.addWidget(self.concurrency_spin)
+        engine_layout.addWidget(self.host_concurrency_label)
+        engine_layout.addWidget(self.host_concurrency_spin)
+        engine_layout.addWidget(self.host_interval_label)
+        engine_layout.addWidget(self.host_interval_spin)
+        engine_group.setLayout(engine_layout)
+        downloads_layout.addWidget(engine_group)
+        
+        # Network options for thumbnail and metadata requests
+        network_group = QGroupBox("Network")
+        network_layout = QFormLayout()
+        
+        self.http_pool_spin = QSpinBox()
+        self.http_pool_spin.setRange(1, 64)
+        self.http_retries_spin = QSpinBox()
+        self.http_retries_spin.setRange(0, 10)
+        
+        network_layout.addRow("HTTP Connection Pool Size:", self.http_pool_spin)
+        network_layout.addRow("HTTP Retries:", self.http_retries_spin)
+        network_group.setLayout(network_layout)
+        downloads_layout.addWidget(network_group)
+        
+        # Fragment and chunk options, edited one format profile at a time
+        fragment_group = QGroupBox("Download Engine")
+        fragment_form = QFormLayout()
+        
+        self.fragment_profiles = {}
+        self.fragment_profile_combo = QComboBox()
+        self.fragment_profile_combo.addItems(
+            [self.format_combo.itemText(i) for i in range(self.format_combo.count())]
+        )
+        self.fragment_profile_name = self.fragment_profile_combo.currentText()
+        self.fragment_profile_combo.currentTextChanged.connect(self.switch_fragment_profile)
+        
+        self.fragments_spin = QSpinBox()
+        self.fragments_spin.setRange(1, 32)
+        size_validator = QRegularExpressionValidator(QRegularExpression(f"({SIZE_PATTERN})?"), self)
+        self.chunk_size_edit = QLineEdit()
+        self.chunk_size_edit.setPlaceholderText("e.g. 10M, empty for whole files")
+        self.chunk_size_edit.setValidator(size_validator)
+        self.throttled_rate_edit = QLineEdit()
+        self.throttled_rate_edit.setPlaceholderText("e.g. 100K, re-extract when slower")
+        self.throttled_rate_edit.setValidator(size_validator)
+        self.buffer_size_edit = QLineEdit()
+        self.buffer_size_edit.setPlaceholderText("e.g. 16K, empty for the yt-dlp default")
+        self.buffer_size_edit.setValidator(size_validator)
+        self.autotune_check = QCheckBox("Auto-tune concurrent fragments per site on its first downloads")
+        
+        fragment_form.addRow("Format Profile:", self.fragment_profile_combo)
+        fragment_form.addRow("Concurrent Fragments:", self.fragments_spin)
+        fragment_form.addRow("HTTP Chunk Size:", self.chunk_size_edit)
+        fragment_form.addRow("Throttled Rate:", self.throttled_rate_edit)
+        fragment_form.addRow("Buffer Size:", self.buffer_size_edit)
+        fragment_form.addRow(self.autotune_check)
+        fragment_group.setLayout(fragment_form)
+        engine_tab_layout.addWidget(fragment_group)
+        
+        # External downloader for single-file formats
+        downloader_group = QGroupBox("External Downloader")
+        downloader_form = QFormLayout()
+        
+        self.downloader_combo = QComboBox()
+        self.downloader_combo.addItems(["Native", "aria2c"])
+        self.aria2c_segments_spin = QSpinBox()
+        self.aria2c_segments_spin.setRange(1, 16)
+        
+        downloader_form.addRow("Downloader:", self.downloader_combo)
+        downloader_form.addRow("aria2c Segments per File:", self.aria2c_segments_spin)
+        downloader_group.setLayout(downloader_form)
+        engine_tab_layout.addWidget(downloader_group)
+        
+        # Formats kept from "Probe Formats" for the download that follows
+        probe_group = QGroupBox("Format Probe")
+        probe_form = QFormLayout()
+        
+        self.info_cache_spin = QSpinBox()
+        self.info_cache_spin.setRange(0, 360)
+        self.info_cache_spin.setSuffix(" min")
+        
+        probe_form.addRow("Reuse Probed Formats For (0 disables):", self.info_cache_spin)
+        probe_group.setLayout(probe_form)
+        engine_tab_layout.addWidget(probe_group)
+        
+        # Local job submission API
+        api_group = QGroupBox("Job API")
+        api_form = QFormLayout()
+        
+        self.api_check = QCheckBox("Accept jobs over HTTP on localhost")
+        self.api_port_spin = QSpinBox()
+        self.api_port_spin.setRange(1024, 65535)
+        self.api_token_edit = QLineEdit()
+        self.api_token_edit.setPlaceholderText("optional, sent as Authorization: Bearer <token>")
+        self.api_queue_spin = QSpinBox()
+        self.api_queue_spin.setRange(1, 1000000)
+        self.api_queue_spin.setSingleStep(100)
+        
+        api_form.addRow(self.api_check)
+        api_form.addRow("Port:", self.api_port_spin)
+        api_form.addRow("Token:", self.api_token_edit)
+        api_form.addRow("Max Queued Jobs:", self.api_queue_spin)
+        api_group.setLayout(api_form)
+        automation_layout.addWidget(api_group)
+        
+        # Download archive
+        archive_group = QGroupBox("Download Archive")
+        archive_form = QFormLayout()
+        
+        self.archive_check = QCheckBox("Skip items that were downloaded before in the same format")
+        self.archive_break_check = QCheckBox("Stop playlists at the first item already in the archive")
+        self.archive_edit = QLineEdit()
+        
+        archive_form.addRow(self.archive_check)
+        archive_form.addRow(self.archive_break_check)
+        archive_form.addRow("Archive File:", self.archive_edit)
+        archive_group.setLayout(archive_form)
+        automation_layout.addWidget(archive_group)
+        
+        general_layout.addStretch()
+        downloads_layout.addStretch()
+        engine_tab_layout.addStretch()
+        automation_layout.addStretch()
+        # Tabs scroll when their groups need more height than the dialog has
+        for tab, title in (
+            (general_tab, "General"), (downloads_tab, "Downloads"),
+            (engine_tab, "Engine"), (automation_tab, "Automation")
+        ):
+            scroll = QScrollArea()
+            scroll.setWidgetResizable(True)
+            scroll.setFrameShape(QFrame.Shape.NoFrame)
+            scroll.setWidget(tab)
+            tabs.addTab(scroll, title)
+        layout.addWidget(tabs)
         
         # Buttons
         self.save_button = QPushButton("Save Settings")
@@ -162,7 +351,30 @@ class SettingsDialog(QDialog):
         if path:
             self.ffmpeg_edit.setText(path)
     
+    def store_fragment_profile(self):
+        self.fragment_profiles[self.fragment_profile_name] = {
+            "concurrent_fragments": self.fragments_spin.value(),
+            "http_chunk_size": self.chunk_size_edit.text().strip(),
+            "throttled_rate": self.throttled_rate_edit.text().strip(),
+            "buffer_size": self.buffer_size_edit.text().strip()
+        }
+    
+    def load_fragment_profile(self):
+        profile = dict(FRAGMENT_DEFAULTS)
+        profile.update(self.fragment_profiles.get(self.fragment_profile_name, {}))
+        self.fragments_spin.setValue(profile["concurrent_fragments"])
+        self.chunk_size_edit.setText(profile["http_chunk_size"])
+        self.throttled_rate_edit.setText(profile["throttled_rate"])
+        self.buffer_size_edit.setText(profile["buffer_size"])
+    
+    def switch_fragment_profile(self, name):
+        """Keep the edits of the previous profile before showing another one"""
+        self.store_fragment_profile()
+        self.fragment_profile_name = name
+        self.load_fragment_profile()
+    
     def get_settings(self):
+        self.store_fragment_profile()
         return {
             "download_path": self.path_edit.text(),
             "ffmpeg_path": self.ffmpeg_edit.text(),
@@ -171,10 +383,34 @@ class SettingsDialog(QDialog):
             "audio_quality": self.audio_quality_combo.currentText(),
             "add_metadata": self.metadata_check.isChecked(),
             "embed_thumbnails": self.thumbnail_check.isChecked(),
+            "thumbnail_cache_mb": self.thumbnail_cache_spin.value(),
             "verbosity": self.verbosity_combo.currentText(),
+            "log_max_lines": self.log_lines_spin.value(),
+            "log_file": self.log_file_edit.text().strip(),
             "simulate": self.simulate_check.isChecked(),
             "ignore_errors": self.ignore_errors_check.isChecked(),
-            "enable_workarounds": self.workarounds_check.isChecked()
+            "enable_workarounds": self.workarounds_check.isChecked(),
+            "download_engine": self.engine_combo.currentText(),
+            "stage_in_destination": self.stage_check.isChecked(),
+            "resume_downloads": self.resume_check.isChecked(),
+            "expand_playlists": self.expand_check.isChecked(),
+            "fragment_profiles": self.fragment_profiles,
+            "fragment_autotune": self.autotune_check.isChecked(),
+            "external_downloader": self.downloader_combo.currentText(),
+            "aria2c_segments": self.aria2c_segments_spin.value(),
+            "info_cache_minutes": self.info_cache_spin.value(),
+            "max_concurrent_downloads": self.concurrency_spin.value(),
+            "host_max_in_flight": self.host_concurrency_spin.value(),
+            "host_min_interval": self.host_interval_spin.value(),
+            "http_pool_size": self.http_pool_spin.value(),
+            "http_retries": self.http_retries_spin.value(),
+            "api_enabled": self.api_check.isChecked(),
+            "api_port": self.api_port_spin.value(),
+            "api_token": self.api_token_edit.text().strip(),
+            "api_max_queued": self.api_queue_spin.value(),
+            "use_download_archive": self.archive_check.isChecked(),
+            "archive_break_on_existing": self.archive_break_check.isChecked(),
+            "download_archive": self.archive_edit.text().strip() or ARCHIVE_FILE
         }
     
     def set_settings(self, settings):
@@ -189,378 +425,294 @@ class SettingsDialog(QDialog):
         # Set metadata options
         self.metadata_check.setChecked(settings.get("add_metadata", True))
         self.thumbnail_check.setChecked(settings.get("embed_thumbnails", True))
+        self.thumbnail_cache_spin.setValue(settings.get("thumbnail_cache_mb", 50))
         
         # Set verbosity options
         self.verbosity_combo.setCurrentText(settings.get("verbosity", "Normal"))
+        self.log_lines_spin.setValue(settings.get("log_max_lines", 5000))
+        self.log_file_edit.setText(settings.get("log_file", "download.log"))
         self.simulate_check.setChecked(settings.get("simulate", False))
         self.ignore_errors_check.setChecked(settings.get("ignore_errors", False))
         self.workarounds_check.setChecked(settings.get("enable_workarounds", True))
+        
+        # Set engine options
+        self.engine_combo.setCurrentText(settings.get("download_engine", "In-process"))
+        self.stage_check.setChecked(settings.get("stage_in_destination", True))
+        self.resume_check.setChecked(settings.get("resume_downloads", True))
+        self.expand_check.setChecked(settings.get("expand_playlists", True))
+        
+        # Set download engine options
+        self.fragment_profiles = {name: dict(profile) for name, profile in settings.get("fragment_profiles", {}).items()}
+        self.load_fragment_profile()
+        self.autotune_check.setChecked(settings.get("fragment_autotune", False))
+        self.downloader_combo.setCurrentText(settings.get("external_downloader", "Native"))
+        self.aria2c_segments_spin.setValue(settings.get("aria2c_segments", ARIA2C_SEGMENTS))
+        self.info_cache_spin.setValue(settings.get("info_cache_minutes", INFO_CACHE_MINUTES))
+        self.concurrency_spin.setValue(settings.get("max_concurrent_downloads", 3))
+        self.host_concurrency_spin.setValue(settings.get("host_max_in_flight", 2))
+        self.host_interval_spin.setValue(settings.get("host_min_interval", 5))
+        self.http_pool_spin.setValue(settings.get("http_pool_size", 8))
+        self.http_retries_spin.setValue(settings.get("http_retries", 3))
+        
+        # Set API options
+        self.api_check.setChecked(settings.get("api_enabled", False))
+        self.api_port_spin.setValue(settings.get("api_port", 8787))
+        self.api_token_edit.setText(settings.get("api_token", ""))
+        self.api_queue_spin.setValue(settings.get("api_max_queued", 1000))
+        
+        # Set archive options
+        self.archive_check.setChecked(settings.get("use_download_archive", True))
+        self.archive_break_check.setChecked(settings.get("archive_break_on_existing", False))
+        self.archive_edit.setText(settings.get("download_archive", ARCHIVE_FILE))
 
-class DownloadThread(QThread):
-    progress_signal = pyqtSignal(int, str)
-    output_signal = pyqtSignal(str)
+class DependencyProbe(QThread):
+    """Runs a DependencyCheck off the GUI thread, the result is read once the thread has finished"""
+    def __init__(self, ffmpeg_dir=""):
+        super().__init__()
+        self.check = DependencyCheck(ffmpeg_dir)
+        self.result = None
+    
+    def run(self):
+        self.result = self.check.run()
+
+class UpdateThread(QThread):
+    """Runs `yt-dlp -U` off the GUI thread and streams its output line by line"""
+    log_signal = pyqtSignal(list)
     finished_signal = pyqtSignal(bool, str)
     
-    def __init__(self, url, options, ffmpeg_dir=None, settings=None):
+    def run(self):
+        success, message = update_ytdlp(lambda line: self.log_signal.emit([line]))
+        self.finished_signal.emit(success, message)
+
+class _ProbeEvents(TaskEvents):
+    """Forwards the log of probe tasks to the owning ProbeThread"""
+    def __init__(self, thread):
+        self.thread = thread
+    
+    def log(self, lines):
+        self.thread.log_signal.emit(lines)
+
+class ProbeThread(QThread):
+    """Lists the formats of URLs off the GUI thread and keeps them for the following download"""
+    log_signal = pyqtSignal(list)
+    finished_signal = pyqtSignal(int, int)
+    
+    def __init__(self, urls, options, ffmpeg_dir, settings):
         super().__init__()
-        self.url = url
+        self.urls = urls
         self.options = options
         self.ffmpeg_dir = ffmpeg_dir
-        self.settings = settings or {}
-        self.is_running = True
-        self.downloaded_files = []
+        self.settings = settings
     
     def run(self):
-        try:
-            # Create a temporary directory for downloads
-            with tempfile.TemporaryDirectory() as temp_dir:
-                cmd = ["yt-dlp", self.url]
-                
-                # Add verbosity options
-                verbosity_map = {
-                    "Quiet": ["--quiet"],
-                    "Verbose": ["--verbose"],
-                    "Debug": ["--verbose", "--dump-pages"]
-                }
-                verbosity = self.settings.get("verbosity", "Normal")
-                if verbosity in verbosity_map:
-                    cmd.extend(verbosity_map[verbosity])
-                
-                # Add simulation mode
-                if self.settings.get("simulate", False):
-                    cmd.extend(["--simulate", "--no-download"])
-                    self.output_signal.emit("SIMULATION MODE: No files will be downloaded")
-                
-                # Add workaround options
-                if self.settings.get("enable_workarounds", True):
-                    cmd.extend([
-                        "--force-ipv4",
-                        "--sleep-requests", "1",
-                        "--sleep-interval", "5",
-                        "--max-sleep-interval", "30"
-                    ])
-                
-                # Add error handling
-                if self.settings.get("ignore_errors", False):
-                    cmd.extend(["--ignore-errors"])
-                
-                # Add optimized download options
-                cmd.extend([
-                    "--no-continue",
-                    "--no-part",
-                    "--console-title",
-                    "--no-cache-dir",
-                    "--retries", "10",
-                    "--fragment-retries", "10",
-                    "--socket-timeout", "30"
-                ])
-                
-                # Enhanced format selection
-                format_map = {
-                    "Best Quality": ["-f", "bestvideo+bestaudio/best"],
-                    "1080p": ["-f", "bestvideo[height<=1080]+bestaudio/best[height<=1080]"],
-                    "720p": ["-f", "bestvideo[height<=720]+bestaudio/best[height<=720]"],
-                    "480p": ["-f", "bestvideo[height<=480]+bestaudio/best[height<=480]"],
-                    "360p": ["-f", "bestvideo[height<=360]+bestaudio/best[height<=360]"],
-                    "Audio Only (MP3)": ["-x", "--audio-format", "mp3"],
-                    "Audio Only (OGG)": ["-x", "--audio-format", "ogg"]
-                }
-                
-                format_option = self.options.get("format", "Best Quality")
-                if format_option in format_map:
-                    cmd.extend(format_map[format_option])
-                else:
-                    cmd.extend(["-f", "bestvideo+bestaudio/best"])
-                
-                # Add audio quality option if audio format is selected
-                if "Audio Only" in format_option:
-                    quality_map = {
-                        "192KBPS": ["--audio-quality", "192K"],
-                        "256KBPS": ["--audio-quality", "256K"],
-                        "320KBPS": ["--audio-quality", "320K"],
-                        "Best": []  # Default is best quality
-                    }
-                    audio_quality = self.options.get("audio_quality", "192KBPS")
-                    if audio_quality in quality_map:
-                        cmd.extend(quality_map[audio_quality])
-                
-                # Set output path to temp directory first
-                temp_output = os.path.join(temp_dir, "%(title)s [%(id)s].%(ext)s")
-                cmd.extend(["-o", temp_output])
-                
-                # Add FFmpeg location if specified
-                if self.ffmpeg_dir:
-                    cmd.extend(["--ffmpeg-location", self.ffmpeg_dir])
-                
-                # Playlist handling
-                if self.options.get("is_playlist", False):
-                    cmd.append("--yes-playlist")
-                else:
-                    cmd.append("--no-playlist")
-                
-                # Container options
-                if format_option not in ["Audio Only (MP3)", "Audio Only (OGG)"]:
-                    container = self.options.get("container", "MP4")
-                    if container != "Original":
-                        cmd.extend(["--merge-output-format", container.lower()])
-                
-                # Metadata options
-                if format_option in ["Audio Only (MP3)", "Audio Only (OGG)"]:
-                    if self.settings.get("add_metadata", True):
-                        cmd.append("--add-metadata")
-                    if self.settings.get("embed_thumbnails", True):
-                        cmd.append("--embed-thumbnail")
-                
-                # Additional options
-                if self.options.get("write_thumbnail", False):
-                    cmd.append("--write-thumbnail")
-                if self.options.get("write_description", False):
-                    cmd.append("--write-description")
-                
-                self.output_signal.emit(f"Command: {' '.join(cmd)}\n")
-                
-                # Prepare process startup info
-                startupinfo = None
-                creation_flags = 0
-                if sys.platform == "win32":
-                    startupinfo = subprocess.STARTUPINFO()
-                    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                    if getattr(sys, 'frozen', False):
-                        creation_flags = subprocess.CREATE_NO_WINDOW
-                
-                try:
-                    process = subprocess.Popen(
-                        cmd,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.STDOUT,
-                        text=True,
-                        bufsize=8192,
-                        universal_newlines=True,
-                        startupinfo=startupinfo,
-                        creationflags=creation_flags
-                    )
-                except FileNotFoundError:
-                    self.output_signal.emit("Error: yt-dlp not found. Please ensure it's installed.")
-                    self.finished_signal.emit(False, "yt-dlp not installed")
-                    return
-                except Exception as e:
-                    self.output_signal.emit(f"Error starting process: {str(e)}")
-                    self.finished_signal.emit(False, f"Process error: {str(e)}")
-                    return
-                
-                if process.stdout is None:
-                    self.output_signal.emit("Error: No output stream available from process")
-                    self.finished_signal.emit(False, "No process output")
-                    return
-                
-                # Read output in chunks
-                last_progress_time = time.time()
-                while self.is_running:
-                    chunk = process.stdout.read(4096)
-                    if not chunk:
-                        break
-                    
-                    # Process chunk line by line
-                    for line in chunk.splitlines():
-                        self.output_signal.emit(line)
-                        
-                        # Throttle progress updates
-                        current_time = time.time()
-                        if current_time - last_progress_time > 0.1:
-                            if "[download]" in line or "[ExtractAudio]" in line or "[Merger]" in line:
-                                match = re.search(r'(\d+\.\d+)%', line)
-                                if match:
-                                    progress = float(match.group(1))
-                                    self.progress_signal.emit(int(progress), line.strip())
-                                    last_progress_time = current_time
-                    
-                    # Allow system to process events
-                    QApplication.processEvents()
-                
-                if not self.is_running:
-                    process.terminate()
-                    self.finished_signal.emit(False, "Download stopped by user")
-                    return
-                
-                process.wait()
-                
-                # Handle simulation mode
-                if self.settings.get("simulate", False):
-                    self.finished_signal.emit(True, "Simulation completed successfully")
-                    return
-                
-                # Process downloaded files
-                if process.returncode == 0:
-                    final_output = self.options.get("output_path", "")
-                    if final_output:
-                        final_output = os.path.abspath(final_output)
-                        os.makedirs(final_output, exist_ok=True)
-                        
-                        # Move files from temp to final location
-                        moved_files = []
-                        for filename in os.listdir(temp_dir):
-                            src_path = os.path.join(temp_dir, filename)
-                            dest_path = os.path.join(final_output, filename)
-                            
-                            if os.path.isdir(src_path):
-                                continue
-                                
-                            if os.path.exists(dest_path):
-                                try:
-                                    os.remove(dest_path)
-                                except Exception as e:
-                                    self.output_signal.emit(f"Error removing existing file: {str(e)}")
-                                    continue
-                            
-                            try:
-                                shutil.move(src_path, dest_path)
-                                moved_files.append(dest_path)
-                                self.output_signal.emit(f"Moved to: {dest_path}")
-                            except Exception as e:
-                                self.output_signal.emit(f"Error moving file: {str(e)}")
-                        
-                        self.downloaded_files = moved_files
-                    
-                    # Add metadata to audio files
-                    if format_option in ["Audio Only (MP3)", "Audio Only (OGG)"] and self.downloaded_files:
-                        try:
-                            info_cmd = ["yt-dlp", "--skip-download", "-j", self.url]
-                            creation_flags = 0
-                            if sys.platform == "win32" and getattr(sys, 'frozen', False):
-                                creation_flags = subprocess.CREATE_NO_WINDOW
-                                
-                            info_output = subprocess.check_output(
-                                info_cmd, 
-                                text=True, 
-                                stderr=subprocess.STDOUT,
-                                creationflags=creation_flags
-                            )
-                            video_info = json.loads(info_output)
-                            
-                            for file_path in self.downloaded_files:
-                                if os.path.exists(file_path):
-                                    ext = os.path.splitext(file_path)[1].lower()
-                                    if ext in ['.mp3', '.ogg']:
-                                        self.add_metadata(file_path, video_info)
-                                        
-                                        if self.settings.get("embed_thumbnails", True):
-                                            self.embed_thumbnail(file_path, video_info)
-                        except Exception as e:
-                            self.output_signal.emit(f"Metadata processing error: {str(e)}")
-                    
-                    self.finished_signal.emit(True, "Download completed successfully!")
-                else:
-                    self.finished_signal.emit(False, f"Download failed with code {process.returncode}")
-        
-        except Exception as e:
-            self.finished_signal.emit(False, f"Error: {str(e)}")
+        probed = 0
+        for url in self.urls:
+            task = DownloadTask(url, self.options, self.ffmpeg_dir, self.settings, events=_ProbeEvents(self))
+            if task.probe() is not None:
+                probed += 1
+        self.finished_signal.emit(probed, len(self.urls))
+
+class _ThreadEvents(TaskEvents):
+    """Turns DownloadTask events into queued Qt signals of the owning thread"""
+    def __init__(self, thread):
+        self.thread = thread
     
-    def add_metadata(self, file_path, video_info):
-        """Add enhanced metadata to audio files"""
-        try:
-            title = video_info.get('title', 'Unknown Title')
-            artist = video_info.get('uploader', 'Unknown Artist')
-            album = "YouTube Downloads"
-            date = video_info.get('upload_date', '')[:4]  
-            
-            ext = os.path.splitext(file_path)[1].lower()
-            
-            if ext == '.mp3':
-                try:
-                    audio = MP3(file_path, ID3=EasyID3)
-                except:
-                    audio = MP3(file_path)
-                    try:
-                        audio.add_tags(ID3=EasyID3)
-                    except Exception as e:
-                        self.output_signal.emit(f"Error adding tags: {str(e)}")
-                        return
-                    audio = MP3(file_path, ID3=EasyID3)
-                
-                audio["title"] = title
-                audio["artist"] = artist
-                audio["album"] = album
-                if date:
-                    audio["date"] = date
-                audio.save()
-                
-            elif ext == '.ogg':
-                audio = OggVorbis(file_path)
-                audio["title"] = title
-                audio["artist"] = artist
-                audio["album"] = album
-                if date:
-                    audio["date"] = date
-                audio.save()
-                
-            self.output_signal.emit(f"Added metadata to: {os.path.basename(file_path)}")
-        except Exception as e:
-            self.output_signal.emit(f"Metadata error: {str(e)}")
+    def progress(self, value, line, speed):
+        self.thread.progress_signal.emit(value, line, speed)
     
-    def embed_thumbnail(self, file_path, video_info):
-        """Embed thumbnail into audio file"""
-        try:
-            thumbnail_url = video_info.get('thumbnail')
-            if not thumbnail_url:
-                return
-                
-            # Create safe temp directory
-            temp_dir = Path(getattr(sys, '_MEIPASS', Path.cwd())) / "temp"
-            temp_dir.mkdir(exist_ok=True)
-                
-            response = requests.get(thumbnail_url, stream=True, timeout=10)
-            with tempfile.NamedTemporaryFile(
-                delete=False, 
-                suffix=".jpg", 
-                dir=str(temp_dir)
-            ) as tmp_file:
-                shutil.copyfileobj(response.raw, tmp_file)
-                thumb_path = tmp_file.name
-            
-            img = Image.open(thumb_path)
-            img.thumbnail((500, 500))
-            img.save(thumb_path, "JPEG")
-            
-            ext = os.path.splitext(file_path)[1].lower()
-            
-            if ext == '.mp3':
-                try:
-                    audio = MP3(file_path, ID3=ID3)
-                except:
-                    audio = MP3(file_path)
-                    try:
-                        audio.add_tags()
-                    except Exception as e:
-                        self.output_signal.emit(f"Error adding tags: {str(e)}")
-                        return
-    
-                if audio.tags is not None:
-                    apic = APIC(
-                        encoding=3,
-                        mime='image/jpeg',
-                        type=3, 
-                        desc='Cover',
-                        data=open(thumb_path, 'rb').read()
-                    )
-                    audio.tags.add(apic)
-                    audio.save()
+    def stage(self, stage):
+        self.thread.stage_signal.emit(stage)
+    
+    def file(self, path):
+        self.thread.file_signal.emit(path)
+    
+    def entries(self, entries):
+        self.thread.entries_signal.emit(entries)
+    
+    def error(self, message):
+        self.thread.error_signal.emit(message)
+    
+    def log(self, lines):
+        self.thread.log_signal.emit(lines)
+    
+    def finished(self, success, message):
+        self.thread.finished_signal.emit(success, message)
 
-            elif ext == '.ogg':
-                audio = OggVorbis(file_path)
-                with open(thumb_path, "rb") as f:
-                    image_data = f.read()
-                audio["METADATA_BLOCK_PICTURE"] = [
-                    base64.b64encode(image_data).decode('utf-8')
-                ]
-                audio.save()
-                
-            os.unlink(thumb_path)
-            self.output_signal.emit(f"Embedded thumbnail in: {os.path.basename(file_path)}")
-        except Exception as e:
-            self.output_signal.emit(f"Thumbnail error: {str(e)}")
+class DownloadThread(QThread):
+    # Typed, rate-limited events; raw log lines travel in batches
+    progress_signal = pyqtSignal(int, str, float)
+    stage_signal = pyqtSignal(str)
+    file_signal = pyqtSignal(str)
+    entries_signal = pyqtSignal(list)
+    error_signal = pyqtSignal(str)
+    log_signal = pyqtSignal(list)
+    finished_signal = pyqtSignal(bool, str)
+    
+    def __init__(self, url, options, ffmpeg_dir=None, settings=None, journal=None, key=None):
+        super().__init__()
+        self.task = DownloadTask(url, options, ffmpeg_dir, settings, journal, key, events=_ThreadEvents(self))
+    
+    @property
+    def is_running(self):
+        return self.task.is_running
+    
+    def run(self):
+        self.task.run()
     
     def stop(self):
-        self.is_running = False
+        self.task.stop()
+
+class DownloadScheduler(QObject, JobQueue):
+    """Runs the shared queue policy on DownloadThreads and reports it through Qt signals"""
+    job_updated = pyqtSignal(object)
+    log_signal = pyqtSignal(list)
+    batch_finished = pyqtSignal(int, int)
+    
+    def __init__(self, max_workers=3, parent=None):
+        QObject.__init__(self, parent)
+        JobQueue.__init__(self, max_workers)
+        self._thread_jobs = {}
+        
+        self._wake_timer = QTimer(self)
+        self._wake_timer.setSingleShot(True)
+        self._wake_timer.timeout.connect(self._fill)
+    
+    def add_job(self, url, options, ffmpeg_dir, settings):
+        return self.queue_job(url, options, ffmpeg_dir, settings)
+    
+    def start(self):
+        self._fill()
+    
+    def stop_all(self):
+        JobQueue.stop_all(self)
+        self._wake_timer.stop()
+    
+    def row(self, job):
+        """Position of a job in the job list and table"""
+        return job.job_id - self.jobs[0].job_id
+    
+    def _fill(self):
+        next_wake = self.fill()
+        if next_wake is not None and len(self.running) < max(1, self.max_workers):
+            self._wake_timer.start(int(next_wake * 1000) + 1)
+        
+        if not self.running and not self.queue and not self.expanding:
+            jobs = self.leaf_jobs()
+            succeeded = sum(1 for job in jobs if job.status == "Completed")
+            self.batch_finished.emit(succeeded, len(jobs) - succeeded)
+    
+    def _launch(self, job, options):
+        job.thread = DownloadThread(job.url, options, job.ffmpeg_dir, job.settings, self.journal, job.key)
+        job.thread.progress_signal.connect(self._job_progress)
+        job.thread.stage_signal.connect(self._job_stage)
+        job.thread.entries_signal.connect(self._job_entries)
+        job.thread.error_signal.connect(self._job_error)
+        job.thread.log_signal.connect(self._job_output)
+        job.thread.finished_signal.connect(self._job_finished)
+        job.thread.finished.connect(self._thread_done)
+        self._thread_jobs[job.thread] = job
+        self.log_signal.emit([f"Starting download: {job.url}"])
+        job.thread.start()
+    
+    def _task(self, job):
+        return job.thread.task if job.thread is not None else None
+    
+    def _notify(self, job, event, value=None):
+        if event == "log":
+            self._job_lines(job, value)
+            return
+        if event == "finished":
+            self.log_signal.emit([f"{job.url}: {value}"])
+        self.job_updated.emit(job)
+    
+    def _wake(self):
+        # Coalesce back-to-back changes into a single pass over the queue
+        self._wake_timer.start(0)
+    
+    def _job_lines(self, job, lines):
+        if len(self.jobs) > 1:
+            prefix = f"[{job.job_id}] "
+            lines = [prefix + line for line in lines]
+        self.log_signal.emit(lines)
+    
+    def _job_progress(self, value, status, speed):
+        job = self._thread_jobs.get(self.sender())
+        if job is not None:
+            self.job_progress(job, value, status, speed)
+    
+    def _job_stage(self, stage):
+        job = self._thread_jobs.get(self.sender())
+        if job is not None:
+            self.job_stage(job, stage)
+    
+    def _job_entries(self, entries):
+        job = self._thread_jobs.get(self.sender())
+        if job is not None:
+            self.add_entries(job, entries)
+    
+    def _job_error(self, message):
+        job = self._thread_jobs.get(self.sender())
+        if job is not None:
+            self.job_error(job, message)
+    
+    def _job_output(self, lines):
+        job = self._thread_jobs.get(self.sender())
+        if job is not None:
+            self._job_lines(job, lines)
+        else:
+            self.log_signal.emit(lines)
+    
+    def _job_finished(self, success, message):
+        job = self._thread_jobs.get(self.sender())
+        if job is not None:
+            self.job_finished(job, job.thread.task, success, message)
+    
+    def _thread_done(self):
+        """Drop a worker once its run() has fully returned, without blocking on it"""
+        thread = self.sender()
+        job = self._thread_jobs.pop(thread, None)
+        if job is not None and job.thread is thread:
+            job.thread = None
+        thread.deleteLater()
+
+class ApiBridge(QObject):
+    """Job API backend for the GUI, runs every call on the GUI thread and waits for its result"""
+    call_signal = pyqtSignal(object)
+    
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.call_signal.connect(self._run)
+    
+    def call(self, function, *args):
+        request = {"function": function, "args": args, "done": threading.Event()}
+        self.call_signal.emit(request)
+        if not request["done"].wait(30):
+            from job_api import ApiError
+            raise ApiError(503, "The application is not responding")
+        if "error" in request:
+            raise request["error"]
+        return request["result"]
+    
+    def _run(self, request):
+        try:
+            request["result"] = request["function"](*request["args"])
+        except Exception as e:
+            request["error"] = e
+        finally:
+            request["done"].set()
+    
+    def queued_count(self):
+        return self.call(lambda: len(self.app.scheduler.queue))
+    
+    def submit(self, urls, options):
+        return self.call(self.app.api_submit, urls, options)
+    
+    def jobs(self):
+        return self.call(lambda: list(self.app.scheduler.jobs))
+    
+    def cancel(self, job):
+        return self.call(self.app.scheduler.cancel, job)
 
 class YouTubeDownloaderApp(QMainWindow):
     def __init__(self):
@@ -586,7 +738,7 @@ class YouTubeDownloaderApp(QMainWindow):
             QLabel {
                 color: #ddd;
             }
-            QLineEdit, QComboBox, QTextEdit, QProgressBar {
+            QLineEdit, QComboBox, QTextEdit, QPlainTextEdit, QProgressBar {
                 background-color: #3a3a3a;
                 color: #eee;
                 border: 1px solid #444;
@@ -624,9 +776,20 @@ class YouTubeDownloaderApp(QMainWindow):
         
         self.settings_file = "settings.json"
         self.settings = self.load_settings()
-        
-        self.download_queue = []
-        self.current_download = None
+        self.journal = JobJournal("download_journal.json")
+        self.dependency_probe = None
+        self.dependencies_stale = False
+        self.update_thread = None
+        self.probe_thread = None
+        self.file_log = None
+        self.api_server = None
+        self.api_batch = False
+        
+        self.scheduler = DownloadScheduler(self.settings.get("max_concurrent_downloads", 3), self)
+        self.scheduler.journal = self.journal
+        self.scheduler.job_updated.connect(self.update_job)
+        self.scheduler.log_signal.connect(self.log_messages)
+        self.scheduler.batch_finished.connect(self.batch_finished)
         
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -687,7 +850,15 @@ class YouTubeDownloaderApp(QMainWindow):
         self.container_label = QLabel("Container:")
         self.audio_quality_label = QLabel("Audio Quality:")
         
-        format_layout.addRow("Format:", self.format_combo)
+        self.probe_button = QPushButton("Probe Formats")
+        self.probe_button.setToolTip("List the available formats; a download started soon after reuses them")
+        self.probe_button.clicked.connect(self.probe_formats)
+        
+        format_row = QHBoxLayout()
+        format_row.addWidget(self.format_combo, 1)
+        format_row.addWidget(self.probe_button)
+        
+        format_layout.addRow("Format:", format_row)
         format_layout.addRow(self.container_label, self.container_combo)
         format_layout.addRow(self.audio_quality_label, self.audio_quality_combo)
         format_layout.addRow("Output Folder:", output_layout)
@@ -719,9 +890,19 @@ class YouTubeDownloaderApp(QMainWindow):
         self.queue_label = QLabel("Queue: 0")
         self.queue_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
+        self.job_table = QTableWidget(0, 4)
+        self.job_table.setHorizontalHeaderLabels(["URL", "Status", "Progress", "Speed"])
+        self.job_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.job_table.verticalHeader().setVisible(False)
+        self.job_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.job_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.job_table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.job_table.customContextMenuRequested.connect(self.show_job_menu)
+        
         progress_layout.addWidget(self.progress_bar)
         progress_layout.addWidget(self.status_label)
         progress_layout.addWidget(self.queue_label)
+        progress_layout.addWidget(self.job_table)
         
         progress_group.setLayout(progress_layout)
         main_layout.addWidget(progress_group)
@@ -730,9 +911,12 @@ class YouTubeDownloaderApp(QMainWindow):
         console_group = QGroupBox("Download Log")
         console_layout = QVBoxLayout()
         
-        self.console_output = QTextEdit()
+        # Plain text view that drops the oldest lines past the configured cap
+        self.console_output = QPlainTextEdit()
         self.console_output.setReadOnly(True)
         self.console_output.setFont(QFont("Courier New", 10))
+        self.console_output.setMaximumBlockCount(self.settings.get("log_max_lines", 5000))
+        self.configure_file_log()
         
         console_layout.addWidget(self.console_output)
         console_group.setLayout(console_layout)
@@ -760,9 +944,13 @@ class YouTubeDownloaderApp(QMainWindow):
         
         main_layout.addLayout(button_layout)
         
-        self.download_thread = None
-        
         self.check_dependencies()
+        self.start_api()
+        
+        # Ask about leftover jobs once the window is up
+        self.unfinished_jobs = self.journal.unfinished()
+        if self.unfinished_jobs:
+            QTimer.singleShot(0, self.offer_resume)
     
     def update_format_ui(self):
         """Update UI based on selected format"""
@@ -793,9 +981,9 @@ class YouTubeDownloaderApp(QMainWindow):
         tools_menu = QMenu("Tools", self)
         menu_bar.addMenu(tools_menu)
         
-        update_action = QAction("Check for Updates", self)
-        update_action.triggered.connect(self.check_ytdlp_update)
-        tools_menu.addAction(update_action)
+        self.update_action = QAction("Check for Updates", self)
+        self.update_action.triggered.connect(self.check_ytdlp_update)
+        tools_menu.addAction(self.update_action)
         
         help_menu = QMenu("Help", self)
         menu_bar.addMenu(help_menu)
@@ -820,101 +1008,135 @@ class YouTubeDownloaderApp(QMainWindow):
         except Exception as e:
             self.log_message(f"Error saving settings: {str(e)}")
     
+    def configure_file_log(self):
+        """Send the full download log to a size-rotated file, the console only keeps recent lines"""
+        logger = logging.getLogger("yt-dlp-gui")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+        
+        log_file = self.settings.get("log_file", "download.log")
+        if not log_file:
+            self.file_log = None
+            return
+        try:
+            handler = RotatingFileHandler(
+                log_file,
+                maxBytes=self.settings.get("log_file_mb", 5) * 1024 * 1024,
+                backupCount=3,
+                encoding="utf-8"
+            )
+        except OSError as e:
+            self.file_log = None
+            self.log_message(f"Could not open log file: {str(e)}")
+            return
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger.addHandler(handler)
+        self.file_log = logger
+    
     def browse_output_path(self):
         path = QFileDialog.getExistingDirectory(self, "Select Output Directory")
         if path:
             self.output_edit.setText(path)
     
-    def validate_ffmpeg_dir(self, path):
-        """Verify if FFmpeg directory contains necessary executables"""
-        if not path:
-            return False
-            
-        required_files = ["ffmpeg", "ffprobe"]
-        for file in required_files:
-            for ext in ["", ".exe", ".bat"]:
-                full_path = os.path.join(path, file + ext)
-                if os.path.exists(full_path):
-                    return True
-        return False
-    
     def check_dependencies(self):
-        # Handle frozen app paths
-        if getattr(sys, 'frozen', False):
-            base_path = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
-            ffmpeg_path = os.path.join(base_path, "ffmpeg")
-            if self.validate_ffmpeg_dir(ffmpeg_path):
-                self.log_message(f"Using bundled FFmpeg in: {ffmpeg_path}")
-                return True
-        
-        # Check yt-dlp installation
-        try:
-            result = subprocess.run(
-                ["yt-dlp", "--version"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
-            )
-            if result.returncode == 0:
-                version = result.stdout.strip()
-                self.log_message(f"yt-dlp version: {version}")
-            else:
-                self.log_message("Warning: yt-dlp not found. Please install it.")
-        except Exception as e:
-            self.log_message(f"Error checking yt-dlp: {str(e)}")
-        
-        # Check FFmpeg installation
-        ffmpeg_dir = self.settings.get("ffmpeg_path", "")
-        if ffmpeg_dir and self.validate_ffmpeg_dir(ffmpeg_dir):
-            self.log_message(f"FFmpeg found in: {ffmpeg_dir}")
-            return True
-        
-        # Search common paths for FFmpeg
-        app_dir = os.path.dirname(os.path.abspath(__file__))
-        possible_dirs = [
-            os.path.join(app_dir, "ffmpeg"),
-            os.path.join(app_dir, "ffmpeg", "bin"),
-            os.path.join(app_dir, "bin"),
-            os.path.join(app_dir)
-        ]
-        
-        for dir_path in os.get_exec_path():
-            possible_dirs.append(dir_path)
-        
-        for dir_path in possible_dirs:
-            if self.validate_ffmpeg_dir(dir_path):
-                self.settings["ffmpeg_path"] = dir_path
+        """Look for yt-dlp and FFmpeg in the background, results are logged when ready"""
+        if self.dependency_probe is not None and self.dependency_probe.isRunning():
+            self.dependencies_stale = True
+            return
+        
+        self.dependencies_stale = False
+        self.dependency_probe = DependencyProbe(self.settings.get("ffmpeg_path", ""))
+        self.dependency_probe.finished.connect(self.dependencies_checked)
+        self.dependency_probe.start()
+    
+    def dependencies_checked(self):
+        result = self.dependency_probe.result
+        if result is not None:
+            self.log_messages(result["messages"])
+            if self.settings.get("external_downloader", "Native") == "aria2c" and not result.get("aria2c_path"):
+                self.log_message("Warning: aria2c is selected as downloader but was not found, using the native downloader")
+            if result["ffmpeg_path"] and result["ffmpeg_path"] != self.settings.get("ffmpeg_path"):
+                self.settings["ffmpeg_path"] = result["ffmpeg_path"]
                 self.save_settings()
-                self.log_message(f"Using FFmpeg in: {dir_path}")
-                return True
         
-        self.log_message("Warning: FFmpeg directory not found or incomplete. Some formats may not work properly.")
-        self.log_message("FFmpeg directory must contain both ffmpeg and ffprobe executables")
-        return False
+        # Settings changed while the probe was running
+        if self.dependencies_stale:
+            self.check_dependencies()
+    
+    def ytdlp_updating(self):
+        """yt-dlp may be replacing itself, nothing may start a download or probe meanwhile"""
+        return self.update_thread is not None and self.update_thread.isRunning()
     
     def check_ytdlp_update(self):
-        try:
-            self.log_message("Checking for yt-dlp updates...")
-            result = subprocess.run(
-                ["yt-dlp", "-U"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
-            )
-            output = result.stdout
-            self.log_message(output)
-            
-            if "is up to date" in output:
-                QMessageBox.information(self, "Update Check", "yt-dlp is up to date")
-            elif "Updated yt-dlp to version" in output:
-                QMessageBox.information(self, "Update Check", "yt-dlp has been updated")
-            else:
-                QMessageBox.warning(self, "Update Check", "Could not check for updates")
-        except Exception as e:
-            self.log_message(f"Update check failed: {str(e)}")
-            QMessageBox.critical(self, "Error", f"Update check failed: {str(e)}")
+        """Run yt-dlp's self-update in the background, never while downloads are using it"""
+        if self.ytdlp_updating():
+            return
+        if self.scheduler.active_count() or self.scheduler.queue:
+            QMessageBox.warning(self, "Update Check", "Please wait for the running downloads to finish before updating yt-dlp")
+            return
+        if self.probe_thread is not None and self.probe_thread.isRunning():
+            QMessageBox.warning(self, "Update Check", "Please wait for the format probe to finish before updating yt-dlp")
+            return
+        
+        self.log_message("Checking for yt-dlp updates...")
+        self.update_action.setEnabled(False)
+        self.start_button.setEnabled(False)
+        self.probe_button.setEnabled(False)
+        self.update_thread = UpdateThread()
+        self.update_thread.log_signal.connect(self.log_messages)
+        self.update_thread.finished_signal.connect(self.update_finished)
+        self.update_thread.start()
+    
+    def update_finished(self, success, message):
+        self.update_action.setEnabled(True)
+        self.start_button.setEnabled(True)
+        self.probe_button.setEnabled(True)
+        
+        if message == YTDLP_UPDATED:
+            # Drop engines and the cached version so nothing keeps using the old build
+            ENGINE_POOL.clear()
+            DependencyCheck().invalidate()
+            self.check_dependencies()
+            if self.settings.get("download_engine", "In-process") == "In-process":
+                self.log_message("Restart the application to load the updated yt-dlp module in the in-process engine")
+        
+        if success:
+            QMessageBox.information(self, "Update Check", message)
+        else:
+            self.log_message(message)
+            QMessageBox.warning(self, "Update Check", message)
+    
+    def probe_formats(self):
+        """Extract the entered URLs without downloading and log their formats"""
+        if self.probe_thread is not None and self.probe_thread.isRunning():
+            return
+        if self.ytdlp_updating():
+            QMessageBox.warning(self, "Probe Formats", "Please wait for the yt-dlp update to finish")
+            return
+        urls = [url.strip() for url in self.url_input.toPlainText().splitlines() if url.strip()]
+        if not urls:
+            QMessageBox.warning(self, "Input Error", "Please enter at least one valid URL")
+            return
+        
+        self.probe_button.setEnabled(False)
+        self.start_button.setEnabled(False)
+        self.status_label.setText(f"Probing formats of {len(urls)} URL(s)...")
+        self.probe_thread = ProbeThread(urls, self.download_options(), self.settings.get("ffmpeg_path", ""), self.settings)
+        self.probe_thread.log_signal.connect(self.log_messages)
+        self.probe_thread.finished_signal.connect(self.probe_finished)
+        self.probe_thread.start()
+    
+    def probe_finished(self, probed, total):
+        self.probe_button.setEnabled(True)
+        if not (self.scheduler.active_count() or self.scheduler.queue):
+            self.start_button.setEnabled(True)
+        if probed == total:
+            self.status_label.setText("Formats listed in the log, ready to download")
+        else:
+            self.status_label.setText(f"Probed {probed} of {total} URL(s), see the log")
     
     def open_settings(self):
         dialog = SettingsDialog(self)
@@ -922,8 +1144,13 @@ class YouTubeDownloaderApp(QMainWindow):
         
         if dialog.exec() == QDialog.DialogCode.Accepted:
             new_settings = dialog.get_settings()
+            api_keys = ("api_enabled", "api_port", "api_token", "api_max_queued")
+            api_changed = any(new_settings[key] != self.settings.get(key) for key in api_keys)
             self.settings.update(new_settings)
             self.save_settings()
+            reset_http_session()
+            self.console_output.setMaximumBlockCount(self.settings.get("log_max_lines", 5000))
+            self.configure_file_log()
             
             # Update UI with new settings
             self.output_edit.setText(self.settings.get("download_path", ""))
@@ -934,6 +1161,8 @@ class YouTubeDownloaderApp(QMainWindow):
             )
             
             self.check_dependencies()
+            if api_changed:
+                self.start_api()
     
     def disable_controls(self):
         """Disable UI controls during download"""
@@ -941,6 +1170,7 @@ class YouTubeDownloaderApp(QMainWindow):
         self.stop_button.setEnabled(True)
         self.url_input.setEnabled(False)
         self.format_combo.setEnabled(False)
+        self.probe_button.setEnabled(False)
         self.container_combo.setEnabled(False)
         self.audio_quality_combo.setEnabled(False)
         self.output_edit.setEnabled(False)
@@ -956,6 +1186,7 @@ class YouTubeDownloaderApp(QMainWindow):
         self.stop_button.setEnabled(False)
         self.url_input.setEnabled(True)
         self.format_combo.setEnabled(True)
+        self.probe_button.setEnabled(True)
         self.container_combo.setEnabled(True)
         self.audio_quality_combo.setEnabled(True)
         self.output_edit.setEnabled(True)
@@ -968,127 +1199,240 @@ class YouTubeDownloaderApp(QMainWindow):
     def start_download(self):
         """Start optimized download process"""
         try:
-            if self.download_thread and self.download_thread.isRunning():
-                self.download_thread.stop()
-                self.download_thread.wait(2000)
+            if self.scheduler.active_count() or self.scheduler.queue:
+                QMessageBox.warning(self, "Download in Progress", "Please wait for the running downloads to finish")
+                return
             
             urls = [url.strip() for url in self.url_input.toPlainText().splitlines() if url.strip()]
             if not urls:
                 QMessageBox.warning(self, "Input Error", "Please enter at least one valid URL")
                 return
             
-            output_path = self.output_edit.text().strip() or self.settings.get("download_path", "")
-            if not output_path:
+            options = self.download_options()
+            if not options["output_path"]:
                 QMessageBox.warning(self, "Input Error", "Please select an output directory")
                 return
             
             try:
-                os.makedirs(output_path, exist_ok=True)
+                os.makedirs(options["output_path"], exist_ok=True)
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Could not create directory: {str(e)}")
                 return
             
-            options = {
-                "format": self.format_combo.currentText(),
-                "container": self.container_combo.currentText(),
-                "audio_quality": self.audio_quality_combo.currentText(),
-                "output_path": output_path,
-                "is_playlist": self.playlist_check.isChecked(),
-                "write_thumbnail": self.thumbnail_check.isChecked(),
-                "write_description": self.description_check.isChecked()
-            }
-            
+            self.api_batch = False
             self.console_output.clear()
+            self.scheduler.clear()
+            self.job_table.setRowCount(0)
+            self.scheduler.max_workers = self.settings.get("max_concurrent_downloads", 3)
+            self.scheduler.budget.configure(self.settings)
             
-            if self.batch_check.isChecked() and len(urls) > 1:
-                self.download_queue = urls
-                self.current_download = None
-                self.queue_label.setText(f"Queue: {len(self.download_queue)}")
-                self.log_message(f"Starting batch download of {len(urls)} items")
-                self.process_next_download()
+            if not (self.batch_check.isChecked() and len(urls) > 1):
+                urls = urls[:1]
             else:
-                self.download_queue = []
-                self.start_single_download(urls[0], options, self.settings.get("ffmpeg_path", ""))
+                self.log_message(
+                    f"Starting batch download of {len(urls)} items "
+                    f"({self.scheduler.max_workers} at a time)"
+                )
+            
+            for url in urls:
+                self.scheduler.add_job(url, options, self.settings.get("ffmpeg_path", ""), self.settings)
+            
+            self.disable_controls()
+            self.progress_bar.setValue(0)
+            self.status_label.setText(f"Starting download: {urls[0][:50]}...")
+            self.scheduler.start()
                 
         except Exception as e:
             self.log_message(f"Download initialization error: {str(e)}")
             QMessageBox.critical(self, "Error", f"Failed to start download: {str(e)}")
     
-    def start_single_download(self, url, options, ffmpeg_dir):
-        """Start download for a single URL"""
+    def download_options(self):
+        """Job options as currently selected in the main window"""
+        return {
+            "format": self.format_combo.currentText(),
+            "container": self.container_combo.currentText(),
+            "audio_quality": self.audio_quality_combo.currentText(),
+            "output_path": self.output_edit.text().strip() or self.settings.get("download_path", ""),
+            "is_playlist": self.playlist_check.isChecked(),
+            "write_thumbnail": self.thumbnail_check.isChecked(),
+            "write_description": self.description_check.isChecked()
+        }
+    
+    def start_api(self):
+        """(Re)start the local job API according to the settings"""
+        if self.api_server is not None:
+            self.api_server.stop()
+            self.api_server = None
+        if not self.settings.get("api_enabled", False):
+            return
+        
+        from job_api import JobApiServer
+        try:
+            self.api_server = JobApiServer(
+                ApiBridge(self),
+                port=self.settings.get("api_port", 8787),
+                token=self.settings.get("api_token", ""),
+                max_queued=self.settings.get("api_max_queued", 1000)
+            ).start()
+            self.log_message(f"Job API listening on http://127.0.0.1:{self.api_server.port}/jobs")
+        except OSError as e:
+            self.log_message(f"Could not start the job API: {str(e)}")
+    
+    def api_submit(self, urls, options):
+        """Queue jobs submitted through the API, called on the GUI thread"""
+        from job_api import RETRY_AFTER, ApiError
+        # The same reason check_ytdlp_update waits for downloads
+        if self.ytdlp_updating():
+            raise ApiError(503, "yt-dlp is being updated", {"Retry-After": str(RETRY_AFTER)})
+        options = dict(self.download_options(), **options)
+        if not options["output_path"]:
+            raise ApiError(400, "No output_path given and no default download path set")
+        os.makedirs(options["output_path"], exist_ok=True)
+        
+        if not self.scheduler.active_count() and not self.scheduler.queue:
+            self.scheduler.max_workers = self.settings.get("max_concurrent_downloads", 3)
+            self.scheduler.budget.configure(self.settings)
+            self.api_batch = True
+        
+        jobs = [
+            self.scheduler.add_job(url, options, self.settings.get("ffmpeg_path", ""), self.settings)
+            for url in urls
+        ]
+        self.log_message(f"Job API queued {len(jobs)} download(s)")
         self.disable_controls()
-        
-        self.progress_bar.setValue(0)
-        self.status_label.setText(f"Starting download: {url[:50]}...")
-        self.log_message(f"Starting download: {url}")
-        
-        self.download_thread = DownloadThread(
-            url, 
-            options, 
-            ffmpeg_dir,
-            self.settings  # Pass all settings
+        self.scheduler.start()
+        return jobs
+    
+    def offer_resume(self):
+        """Offer to resume jobs a previous session left unfinished"""
+        entries, self.unfinished_jobs = self.unfinished_jobs, []
+        if not entries:
+            return
+        
+        reply = QMessageBox.question(
+            self, "Resume Downloads",
+            f"{len(entries)} download(s) from the last session did not finish.\n"
+            "Resume them now? Choosing No discards their partial files.",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         )
-        self.download_thread.progress_signal.connect(self.update_progress)
-        self.download_thread.output_signal.connect(self.log_message)
-        self.download_thread.finished_signal.connect(self.download_finished)
-        self.download_thread.start()
-    
-    def process_next_download(self):
-        """Process next item in download queue"""
-        if self.download_queue:
-            url = self.download_queue.pop(0)
-            self.queue_label.setText(f"Queue: {len(self.download_queue)}")
-            self.start_single_download(
-                url,
-                {
-                    "format": self.format_combo.currentText(),
-                    "container": self.container_combo.currentText(),
-                    "audio_quality": self.audio_quality_combo.currentText(),
-                    "output_path": self.output_edit.text().strip() or self.settings.get("download_path", ""),
-                    "is_playlist": self.playlist_check.isChecked(),
-                    "write_thumbnail": self.thumbnail_check.isChecked(),
-                    "write_description": self.description_check.isChecked()
-                },
-                self.settings.get("ffmpeg_path", "")
-            )
-        else:
-            self.enable_controls()
-            self.status_label.setText("Batch download completed!")
-            QMessageBox.information(self, "Batch Complete", "All downloads finished successfully!")
+        if reply != QMessageBox.StandardButton.Yes:
+            # Entries listed from the discarded playlists go as well
+            keys = {entry["key"] for entry in entries}
+            for entry in self.journal.unfinished(resumable=False):
+                if entry["key"] not in keys and entry.get("parent") not in keys:
+                    continue
+                output_path = entry.get("options", {}).get("output_path", "")
+                if output_path:
+                    shutil.rmtree(
+                        os.path.join(os.path.abspath(output_path), STAGING_DIR_NAME, entry["key"]),
+                        ignore_errors=True
+                    )
+                self.journal.remove(entry["key"])
+            return
+        
+        # Jobs submitted through the API in the meantime stay in the list
+        if self.scheduler.clear():
+            self.job_table.setRowCount(0)
+            self.scheduler.max_workers = self.settings.get("max_concurrent_downloads", 3)
+            self.scheduler.budget.configure(self.settings)
+        for entry in entries:
+            self.scheduler.add_job(entry["url"], entry.get("options", {}), entry.get("ffmpeg_dir", ""), self.settings)
+        
+        self.log_message(f"Resuming {len(entries)} unfinished download(s)")
+        self.disable_controls()
+        self.scheduler.start()
     
     def stop_download(self):
-        if self.download_thread and self.download_thread.isRunning():
-            self.download_thread.stop()
+        # Jobs can sit in the queue with nothing running while a host's start spacing elapses
+        if self.scheduler.active_count() or self.scheduler.queue:
+            self.scheduler.stop_all()
             self.status_label.setText("Download stopped by user")
             self.log_message("Download stopped by user")
+            if not self.scheduler.active_count():
+                # No running job is left to finish the batch and re-enable the controls
+                self.scheduler.start()
     
-    def download_finished(self, success, message):
-        self.status_label.setText(message)
-        self.log_message(message)
-        
-        if success:
-            self.progress_bar.setValue(100)
-            
-            if self.download_queue:
-                QApplication.processEvents()
-                time.sleep(1) 
-                self.process_next_download()
-                return
-        else:
-            QMessageBox.warning(self, "Download Failed", message)
-            
-            self.download_queue = []
-            self.queue_label.setText("Queue: 0")
+    def retry_job(self, job):
+        """Requeue a single failed job, leaving the rest of the queue untouched"""
+        if self.ytdlp_updating():
+            QMessageBox.warning(self, "Retry", "Please wait for the yt-dlp update to finish")
+            return
+        if self.scheduler.retry(job):
+            self.disable_controls()
+            self.log_message(f"Retrying: {job.url}")
+    
+    def show_job_menu(self, pos):
+        row = self.job_table.rowAt(pos.y())
+        if row < 0 or row >= len(self.scheduler.jobs):
+            return
+        job = self.scheduler.jobs[row]
+        
+        menu = QMenu(self)
+        retry_action = menu.addAction("Retry")
+        retry_action.setEnabled(job.status in ("Failed", "Stopped") and not self.ytdlp_updating())
+        retry_action.triggered.connect(lambda: self.retry_job(job))
+        menu.exec(self.job_table.viewport().mapToGlobal(pos))
+    
+    def update_job(self, job):
+        """Refresh the table row and aggregate progress for a job"""
+        row = self.scheduler.row(job)
+        if row >= self.job_table.rowCount():
+            self.job_table.setRowCount(row + 1)
+            # Entries of an expanded playlist are indented below it
+            self.job_table.setItem(row, 0, QTableWidgetItem(job.url if job.parent is None else f"    {job.url}"))
+            for column in range(1, 4):
+                self.job_table.setItem(row, column, QTableWidgetItem())
+        
+        self.job_table.item(row, 1).setText(job.stage or job.status if job.status == "Downloading" else job.status)
+        self.job_table.item(row, 2).setText(f"{job.progress}%")
+        self.job_table.item(row, 3).setText(
+            f"{job.speed / 1048576:.2f} MiB/s" if job.speed else ""
+        )
         
-        self.enable_controls()
+        self.progress_bar.setValue(self.scheduler.overall_progress())
+        if job.message:
+            self.status_label.setText(job.message)
+        self.queue_label.setText(
+            f"Queue: {len(self.scheduler.queue)} | Active: {self.scheduler.active_count()} | "
+            f"Throughput: {self.scheduler.throughput() / 1048576:.2f} MiB/s"
+        )
     
-    def update_progress(self, value, status):
-        self.progress_bar.setValue(value)
-        self.status_label.setText(status)
+    def batch_finished(self, succeeded, failed):
+        self.enable_controls()
+        
+        # Nobody is watching the window for API submitted batches, do not block it with a dialog
+        if self.api_batch:
+            self.api_batch = False
+            self.status_label.setText(f"Batch finished: {succeeded} succeeded, {failed} failed")
+            self.log_message(f"Batch finished: {succeeded} succeeded, {failed} failed")
+            return
+        
+        if len(self.scheduler.jobs) == 1:
+            job = self.scheduler.jobs[0]
+            self.status_label.setText(job.message)
+            if job.status == "Failed":
+                QMessageBox.warning(self, "Download Failed", job.message)
+        elif failed:
+            self.status_label.setText(f"Batch finished: {succeeded} succeeded, {failed} failed")
+            QMessageBox.warning(
+                self, "Batch Complete",
+                f"{failed} of {succeeded + failed} downloads did not finish.\n"
+                "Right-click an item in the job list to retry it."
+            )
+        else:
+            self.status_label.setText("Batch download completed!")
+            QMessageBox.information(self, "Batch Complete", "All downloads finished successfully!")
     
     def log_message(self, message):
-        self.console_output.append(message.strip())
+        self.log_messages([message.strip()])
+    
+    def log_messages(self, messages):
+        """Append a batch of log lines as a single block, and spill them to the log file"""
+        text = "\n".join(message.rstrip() for message in messages)
+        self.console_output.appendPlainText(text)
         self.console_output.moveCursor(QTextCursor.MoveOperation.End)
+        if self.file_log is not None:
+            self.file_log.info(text)
     
     def clear_log(self):
         self.console_output.clear()
@@ -1103,6 +1447,8 @@ class YouTubeDownloaderApp(QMainWindow):
             <li>Multiple format and quality options</li>
             <li>Audio extraction (MP3/OGG)</li>
             <li>Batch download support</li>
+            <li>Concurrent downloads with per-item retry</li>
+            <li>Resumable downloads across restarts</li>
             <li>Metadata embedding (ID3 tags)</li>
             <li>Thumbnail embedding</li>
             <li>Real-time progress tracking</li>
@@ -1115,6 +1461,7 @@ class YouTubeDownloaderApp(QMainWindow):
             <li>Verbosity control (Quiet, Normal, Verbose, Debug)</li>
             <li>Simulation mode</li>
             <li>Workarounds for problematic sites</li>
+            <li>In-process yt-dlp engine</li>
         </ul>
         <p><b>Powered by:</b></p>
         <ul>
@@ -1128,25 +1475,54 @@ class YouTubeDownloaderApp(QMainWindow):
     
     def closeEvent(self, a0: Optional[QCloseEvent]) -> None:
         """Handle window close event"""
-        if self.download_thread and self.download_thread.isRunning():
+        if self.scheduler.active_count() or self.scheduler.queue:
             reply = QMessageBox.question(
                 self, "Download in Progress",
                 "A download is in progress. Are you sure you want to quit?",
                 QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
             )
             if reply == QMessageBox.StandardButton.Yes:
-                self.download_thread.stop()
-                self.download_thread.wait(2000) 
+                threads = [job.thread for job in self.scheduler.running + self.scheduler.expanding]
+                self.scheduler.stop_all()
+                for thread in threads:
+                    thread.wait(2000)
+                self.stop_background_tasks()
                 if a0:
                     a0.accept()
             else:
                 if a0:
                     a0.ignore()
         else:
+            self.stop_background_tasks()
             if a0:
                 a0.accept()
+    
+    def stop_background_tasks(self):
+        """Stop the job API and let background checks finish so their threads are not destroyed while running"""
+        if self.api_server is not None:
+            self.api_server.stop()
+            self.api_server = None
+        if self.dependency_probe is not None:
+            self.dependency_probe.wait(5000)
+        if self.update_thread is not None:
+            self.update_thread.wait(5000)
+        if self.probe_thread is not None:
+            self.probe_thread.wait(5000)
+        self.journal.flush()
 
 def main():
+    """Start the GUI
+
+    With --startup-benchmark the window is closed again as soon as it is shown and
+    the time from main() to window.show() is printed, for tracking cold start over
+    releases. Combine with `python -X importtime regui.py --startup-benchmark` for
+    a per-module import breakdown.
+    """
+    started = time.perf_counter()
+    benchmark = "--startup-benchmark" in sys.argv
+    if benchmark:
+        sys.argv.remove("--startup-benchmark")
+    
     app = QApplication(sys.argv)
     
     app.setStyle("Fusion")
@@ -1158,6 +1534,12 @@ def main():
     
     window = YouTubeDownloaderApp()
     window.show()
+    
+    startup_ms = (time.perf_counter() - started) * 1000
+    logging.getLogger("yt-dlp-gui").info(f"Startup took {startup_ms:.0f} ms")
+    if benchmark:
+        print(f"startup_ms={startup_ms:.1f}")
+        QTimer.singleShot(0, window.close)
     sys.exit(app.exec())
 
 if __name__ == "__main__":